@@ -1,7 +1,11 @@
 import os
+import sys
 from sqlalchemy import text
-from src.api.models import db
-from src.app import create_app
+
+# Import the app the way wsgi.py and `flask` do, so `db` is the instance it was set up with
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'src'))
+from api.models import db  # noqa: E402
+from app import app  # noqa: E402
 
 # Get the database URL from environment
 DATABASE_URL = os.getenv('DATABASE_URL')
@@ -10,9 +14,6 @@ if not DATABASE_URL:
     print("Error: DATABASE_URL not set in environment")
     exit(1)
 
-# Create Flask app context
-app = create_app()
-
 with app.app_context():
     try:
         # Add the columns
@@ -0,0 +1,54 @@
+"""add full-text search index over services
+
+Revision ID: f3b5d7a9c1e2
+Revises: e2a4c6e8f009
+Create Date: 2026-10-18 15:22:07.918236
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b5d7a9c1e2'
+down_revision = 'e2a4c6e8f009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("""
+            CREATE TABLE service_search (
+                service_id INTEGER PRIMARY KEY REFERENCES services(id) ON DELETE CASCADE,
+                document TSVECTOR NOT NULL
+            )
+        """)
+        op.execute("CREATE INDEX ix_service_search_document ON service_search USING GIN (document)")
+        op.execute("""
+            INSERT INTO service_search (service_id, document)
+            SELECT s.id,
+                setweight(to_tsvector('english', coalesce(s.name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(p.business_name, p.name, '')), 'B') ||
+                setweight(to_tsvector('english', coalesce(s.description, '')), 'C')
+            FROM services s JOIN providers p ON p.id = s.provider_id
+        """)
+    elif dialect == 'sqlite':
+        op.execute("""
+            CREATE VIRTUAL TABLE service_search USING fts5(
+                name, business_name, description, tokenize = 'porter unicode61'
+            )
+        """)
+        op.execute("""
+            INSERT INTO service_search (rowid, name, business_name, description)
+            SELECT s.id, s.name, coalesce(p.business_name, p.name, ''),
+                   coalesce(s.description, '')
+            FROM services s JOIN providers p ON p.id = s.provider_id
+        """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name in ('postgresql', 'sqlite'):
+        op.execute("DROP TABLE service_search")
@@ -1,17 +1,69 @@
 import os
 import inspect
-from flask_admin import Admin
+import threading
+import time
+from flask import Flask
 from . import models
 from .models import db
-from flask_admin.contrib.sqla import ModelView
+from .utils import borrow_pool
+from .request_timing import setup_request_timing
+from .metrics import setup_metrics
 
 
 def setup_admin(app):
+    from flask_admin import Admin
+    from flask_admin.contrib.sqla import ModelView
+
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     admin = Admin(app, name='4Geeks Admin')
 
     # Dynamically add all models to the admin interface
     for name, obj in inspect.getmembers(models):
-        # Verify that the object is a SQLAlchemy model before adding it to the admin. 
+        # Verify that the object is a SQLAlchemy model before adding it to the admin.
         if inspect.isclass(obj) and issubclass(obj, db.Model):
-            admin.add_view(ModelView(obj, db.session))
\ No newline at end of file
+            admin.add_view(ModelView(obj, db.session))
+
+
+class LazyAdmin:
+    """
+    WSGI middleware in front of `app` that builds Flask-Admin on the first
+    request under /admin. Importing Flask-Admin and creating a ModelView per
+    model is a good part of start-up time and most workers never serve
+    /admin. The admin lives in its own Flask app with `app`'s config (Flask
+    does not accept new routes once requests are being served), but it uses
+    `app`'s connection pools and the same request timing and metrics hooks.
+    The build time is added to `timings` under 'admin'.
+    """
+
+    def __init__(self, app, wsgi_app, timings):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.timings = timings
+        self.admin_app = None
+        self._lock = threading.Lock()
+
+    def build(self):
+        with self._lock:
+            if self.admin_app is None:
+                start = time.perf_counter()
+                admin_app = Flask(self.app.import_name)
+                admin_app.config.from_mapping(self.app.config)
+                admin_app.url_map.strict_slashes = False
+                db.init_app(admin_app)
+                with self.app.app_context():
+                    owners = dict(db.engines)
+                with admin_app.app_context():
+                    for bind, engine in db.engines.items():
+                        borrow_pool(engine, owners[bind])
+                setup_request_timing(admin_app)
+                setup_metrics(admin_app, endpoint=False)
+                setup_admin(admin_app)
+                self.timings['admin'] = self.timings.get('admin', 0.0) + time.perf_counter() - start
+                self.admin_app = admin_app
+        return self.admin_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path == '/admin' or path.startswith('/admin/'):
+            return (self.admin_app or self.build())(environ, start_response)
+        return self.wsgi_app(environ, start_response)
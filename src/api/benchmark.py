@@ -0,0 +1,208 @@
+"""
+Endpoint benchmark: throughput, latency percentiles and SQL statements per
+request for the hot API routes.
+
+Requests go through the WSGI app in-process (Flask test clients, one per
+worker thread), so the numbers cover routing, auth, the ORM and the
+database but not the network or gunicorn. Point DATABASE_URL at a scratch
+database, SQLite or a local Postgres; it is seeded with `flask seed`
+defaults when empty and written to by the POST scenarios.
+
+    $ SMS_BACKEND=fake DATABASE_URL=sqlite:////tmp/bench.db flask bench-endpoints \\
+        --requests 500 --concurrency 4 --output bench.json
+    $ ... flask bench-endpoints --baseline bench.json   # compare with an earlier run
+
+POST /bookings only queues SMS; the outbox is drained afterwards with the
+fake SMS backend so no real messages are sent.
+"""
+import contextlib
+import io
+import math
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import event
+from api.models import db, User, Provider, Customer, Service
+from api import seed, sms_outbox
+from api.sms_service import SMSService, FakeBackend
+
+# name -> (role, method, path, json body). Paths and bodies are formatted
+# with one identity (see _identities) per request, round-robin.
+SCENARIOS = {
+    'login': (None, 'POST', '/api/login',
+              {'username': '{provider_email}', 'password': '{provider_password}', 'role': 'provider'}),
+    'services': (None, 'GET', '/api/services?limit=50', None),
+    'services_nearby': (None, 'GET', '/api/services/nearby?lat={lat}&lon={lon}&radius=10', None),
+    'provider_bookings': ('provider', 'GET', '/api/provider/bookings?limit=50', None),
+    'provider_earnings': ('provider', 'GET', '/api/provider/earnings', None),
+    'messages_thread': ('customer', 'GET', '/api/messages/{provider_id}', None),
+    'provider_thread': ('provider', 'GET', '/api/messages/provider/{customer_id}', None),
+    'send_message': ('customer', 'POST', '/api/messages',
+                     {'provider_id': '{provider_id}', 'message': 'Benchmark message'}),
+    'create_booking': ('customer', 'POST', '/api/bookings', {'service_id': '{service_id}'}),
+}
+
+IDENTITIES = 10
+WARMUP_REQUESTS = 5
+
+
+class _StatementTally(threading.local):
+    count = 0
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _format(template, identity):
+    if template is None:
+        return None
+    if isinstance(template, dict):
+        return {k: _format(v, identity) for k, v in template.items()}
+    # A lone placeholder keeps the identity value's type (ids stay ints)
+    if template.startswith('{') and template.endswith('}') and template[1:-1] in identity:
+        return identity[template[1:-1]]
+    return template.format(**identity)
+
+
+def _identities():
+    """Provider/customer pairs with a service and a location to use."""
+    rows = db.session.query(
+        Provider.id, Provider.latitude, Provider.longitude,
+        User.email, User.password, Service.id
+    ).join(User, User.id == Provider.user_id).join(
+        Service, Service.provider_id == Provider.id
+    ).filter(
+        Service.is_active.is_(True), Provider.latitude.isnot(None)
+    ).order_by(Provider.id, Service.id).all()
+
+    providers = {}
+    for provider_id, lat, lon, email, password, service_id in rows:
+        providers.setdefault(provider_id, (lat, lon, email, password, service_id))
+
+    customers = db.session.query(Customer.id, User.email, User.password).join(
+        User, User.id == Customer.user_id).order_by(Customer.id).limit(IDENTITIES).all()
+
+    identities = []
+    for (provider_id, provider), customer in zip(list(providers.items())[:IDENTITIES], customers):
+        lat, lon, email, password, service_id = provider
+        identities.append({
+            'provider_id': provider_id, 'provider_email': email,
+            'provider_password': password, 'service_id': service_id,
+            'lat': lat, 'lon': lon, 'customer_id': customer[0],
+            'customer_email': customer[1], 'customer_password': customer[2],
+        })
+    return identities
+
+
+def _login(client, email, password, role):
+    response = client.post('/api/login', json={
+        'username': email, 'password': password, 'role': role})
+    if response.status_code != 200:
+        raise RuntimeError(f"Login failed for {email}: {response.status_code}")
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(app, requests=200, concurrency=4, scenarios=None):
+    """Benchmark each scenario and return the results as a JSON-able dict."""
+    with app.app_context():
+        if db.session.query(User.id).first() is None:
+            seed.generate()
+        identities = _identities()
+        engine = db.engine
+    if not identities:
+        raise RuntimeError("No provider with an active service and a location to benchmark")
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+        return local.client
+
+    setup = app.test_client()
+    for identity in identities:
+        identity['headers'] = {
+            'provider': _login(setup, identity['provider_email'], identity['provider_password'], 'provider'),
+            'customer': _login(setup, identity['customer_email'], identity['customer_password'], 'customer'),
+            None: {},
+        }
+
+    tally = _StatementTally()
+
+    def on_execute(*args):
+        tally.count += 1
+
+    def call(name, i):
+        role, method, path, body = SCENARIOS[name]
+        identity = identities[i % len(identities)]
+        tally.count = 0
+        start = time.perf_counter()
+        response = client().open(
+            _format(path, identity), method=method,
+            json=_format(body, identity), headers=identity['headers'][role])
+        elapsed = time.perf_counter() - start
+        return elapsed, tally.count, response.status_code < 400
+
+    results = {}
+    event.listen(engine, 'before_cursor_execute', on_execute)
+    try:
+        for name in scenarios or SCENARIOS:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(lambda i: call(name, i), range(WARMUP_REQUESTS)))
+
+                start = time.perf_counter()
+                samples = list(pool.map(lambda i: call(name, i), range(requests)))
+                wall = time.perf_counter() - start
+
+            latencies = sorted(s[0] * 1000 for s in samples)
+            results[name] = {
+                'requests': requests,
+                'errors': sum(1 for s in samples if not s[2]),
+                'throughput_rps': round(requests / wall, 1),
+                'mean_ms': round(sum(latencies) / len(latencies), 3),
+                'p50_ms': round(percentile(latencies, 50), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+                'p99_ms': round(percentile(latencies, 99), 3),
+                'queries_per_request': round(sum(s[1] for s in samples) / len(samples), 2),
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', on_execute)
+
+    with app.app_context():
+        sms_sent = 0
+        sms = SMSService(backend=FakeBackend())
+        while True:
+            with contextlib.redirect_stdout(io.StringIO()):
+                sent, failed = sms_outbox.drain(sms)
+            sms_sent += sent
+            if not sent and not failed:
+                break
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'database': engine.url.render_as_string(hide_password=True),
+            'dialect': engine.dialect.name,
+            'python': platform.python_version(),
+            'requests': requests,
+            'concurrency': concurrency,
+            'sms_delivered_fake': sms_sent,
+        },
+        'endpoints': results,
+    }
@@ -0,0 +1,308 @@
+"""
+Read-through response cache for the public catalog endpoints.
+
+Entries are keyed on path + query args + the version counters of the data
+they depend on ("catalog" for /services, "provider:<id>" for a provider's
+own pages). Writes call invalidate_provider(), which bumps those counters;
+old entries can no longer be reached and simply age out. That keeps
+invalidation O(1) for every backend, including shared ones.
+
+Backend is chosen with CACHE_BACKEND:
+    memory (default)  per-process LRU with TTL. The version counters live in
+                      CACHE_VERSION_DIR (default <tmp>/homecalls-cache), one
+                      small file each, so a write handled by one gunicorn
+                      worker invalidates every worker on the host. Several
+                      hosts need the redis backend.
+    redis             shared across workers via CACHE_REDIS_URL; with
+                      CACHE_REDIS_URL=local (or no redis package) an
+                      in-process stand-in with the same client API is used
+    none              caching disabled
+
+conditional() adds strong ETag / Last-Modified validators and answers
+If-None-Match / If-Modified-Since with 304 before the view runs.
+scope_validator() builds those validators from the same version counters
+(the ETag from the versions, Last-Modified from the time of the last bump),
+so a conditional request costs a few O(1) lookups, not a query.
+"""
+import os
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import request, make_response, current_app
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 2048))
+VERSION_DIR = os.environ.get('CACHE_VERSION_DIR') or os.path.join(
+    tempfile.gettempdir(), 'homecalls-cache')
+
+
+class FileVersions:
+    """
+    Version counters shared by every process on the host: one file per
+    name. A bump writes a fresh unique value (atomically, via rename), so
+    readers only ever see an old or a new version, never a torn one.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name.replace(':', '_'))
+
+    def version(self, name):
+        try:
+            with open(self._path(name)) as f:
+                return f.read()
+        except FileNotFoundError:
+            return '0'
+
+    def modified(self, name):
+        try:
+            return datetime.utcfromtimestamp(os.stat(self._path(name)).st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def bump(self, name):
+        path = self._path(name)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(f"{time.time_ns():x}{os.urandom(4).hex()}")
+        os.replace(tmp, path)
+
+
+class LRUCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, versions=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = versions or FileVersions(VERSION_DIR)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, name):
+        return self._versions.version(name)
+
+    def bump(self, name):
+        self._versions.bump(name)
+
+    def modified(self, name):
+        return self._versions.modified(name)
+
+
+class LocalRedis:
+    """In-process stand-in for the subset of the redis client used below."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            expires = time.monotonic() + ex if ex else None
+            self._data[key] = (expires, value)
+
+    def incr(self, key):
+        with self._lock:
+            expires, value = self._data.get(key, (None, 0))
+            value = int(value) + 1
+            self._data[key] = (expires, value)
+            return value
+
+
+class RedisCache:
+    def __init__(self, client, prefix='homecalls:cache:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if isinstance(value, bytes):
+            value = value.decode()
+        return value
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+    def version(self, name):
+        return int(self.client.get(f"{self.prefix}v:{name}") or 0)
+
+    def bump(self, name):
+        self.client.incr(f"{self.prefix}v:{name}")
+        self.client.set(f"{self.prefix}t:{name}", time.time())
+
+    def modified(self, name):
+        value = self.client.get(f"{self.prefix}t:{name}")
+        return None if value is None else datetime.utcfromtimestamp(float(value))
+
+
+def backend_from_env():
+    kind = os.environ.get('CACHE_BACKEND', 'memory')
+    if kind == 'none':
+        return None
+    if kind == 'redis':
+        url = os.environ.get('CACHE_REDIS_URL', 'local')
+        if redis is None or url == 'local':
+            return RedisCache(LocalRedis())
+        return RedisCache(redis.Redis.from_url(url))
+    return LRUCache()
+
+
+backend = backend_from_env()
+
+
+def invalidate(*names):
+    """Bump the version counters `names` (after the change is committed)."""
+    if backend is None:
+        return
+    try:
+        for name in names:
+            backend.bump(name)
+    except Exception as e:
+        current_app.logger.warning("Cache invalidation failed: %s", e)
+
+
+def invalidate_provider(provider_id):
+    """Call after committing a change to a provider or its services."""
+    invalidate(f"provider:{provider_id}", "catalog")
+
+
+def cached(scopes):
+    """
+    Cache a view's successful JSON response. `scopes` maps the view's
+    keyword arguments to the version names the response depends on.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            if backend is None:
+                return fn(*args, **kwargs)
+
+            try:
+                names = scopes(**kwargs)
+                versions = ",".join(f"{n}={backend.version(n)}" for n in names)
+                query = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+                key = f"{request.path}?{query}|{versions}"
+                body = backend.get(key)
+            except Exception as e:
+                current_app.logger.warning("Cache read failed: %s", e)
+                return fn(*args, **kwargs)
+
+            if body is not None:
+                response = make_response(body, 200)
+                response.mimetype = 'application/json'
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = make_response(fn(*args, **kwargs))
+            if response.status_code == 200:
+                try:
+                    backend.set(key, response.get_data(as_text=True), CACHE_TTL)
+                except Exception as e:
+                    current_app.logger.warning("Cache write failed: %s", e)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return decorator
+    return wrapper
+
+
+def scope_validator(scopes, fallback):
+    """
+    Validator for conditional() from the version counters of `scopes` (as
+    for cached()). Last-Modified is the latest bump, or None while a scope
+    has never been bumped. Without a cache backend `fallback` is used.
+    """
+    def validator(**kwargs):
+        if backend is not None:
+            try:
+                names = scopes(**kwargs)
+                versions = [(name, backend.version(name)) for name in names]
+                modified = [backend.modified(name) for name in names]
+                return versions, None if None in modified else max(modified)
+            except Exception as e:
+                current_app.logger.warning("Cache read failed: %s", e)
+        return fallback(**kwargs)
+    return validator
+
+
+def conditional(validator):
+    """
+    Conditional GET for a view. `validator` receives the view's keyword
+    arguments and returns (parts, last_modified): `parts` is any cheap,
+    repr-able summary of the data behind the response (counts, max ids,
+    max updated_at) and last_modified a naive UTC datetime or None.
+
+    Last-Modified has one-second precision, so it is only sent once the
+    second it falls in has passed; until then a second write in the same
+    second could not be told apart and clients revalidate with the ETag.
+    """
+    def wrapper(fn):
+        @wraps(fn)
+        def decorator(*args, **kwargs):
+            parts, last_modified = validator(**kwargs)
+            etag = hashlib.sha1(
+                repr((request.full_path, parts)).encode()).hexdigest()
+            if last_modified is not None:
+                last_modified = last_modified.replace(microsecond=0)
+                if datetime.utcnow() < last_modified + timedelta(seconds=1):
+                    last_modified = None
+                else:
+                    last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = (last_modified is not None and since is not None
+                                and last_modified <= since)
+
+            if not_modified:
+                response = make_response('', 304)
+            else:
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            return response
+        return decorator
+    return wrapper
@@ -1,6 +1,10 @@
 
+import json
+import random
+import time
 import click
-from api.models import db, User
+from api.models import db, User, Customer
+from api import proximity, query_budget, query_plans, sms_outbox, earnings, search, projections, seed, benchmark, tracing
 
 """
 In this file, you can add as many commands as you want using the @app.cli.command decorator
@@ -20,15 +24,313 @@ def setup_commands(app):
         print("Creating test users")
         for x in range(1, int(count) + 1):
             user = User()
+            user.full_name = "Test User " + str(x)
             user.email = "test_user" + str(x) + "@test.com"
             user.password = "123456"
+            user.role = "customer"
             user.is_active = True
+            user.customer_profile = Customer(name=user.full_name)
             db.session.add(user)
-            db.session.commit()
             print("User: ", user.email, " created.")
 
+        db.session.commit()
         print("All test users created")
 
     @app.cli.command("insert-test-data")
     def insert_test_data():
-        pass
\ No newline at end of file
+        """Small seeded dataset for local development (see `flask seed`)."""
+        counts = seed.generate(providers=10, customers=20, bookings=200, threads=20)
+        print("Test data created:", ", ".join(f"{n} {t}" for t, n in counts.items()))
+
+    """
+    Bulk-load a deterministic synthetic dataset for load testing, e.g. a
+    million bookings:
+    $ flask seed --providers 5000 --customers 50000 --bookings 1000000
+    """
+    @app.cli.command("seed")
+    @click.option("--providers", default=100)
+    @click.option("--customers", default=500)
+    @click.option("--services-per-provider", default=4)
+    @click.option("--bookings", default=5000)
+    @click.option("--threads", default=1000)
+    @click.option("--messages-per-thread", default=8)
+    @click.option("--days", default=365)
+    @click.option("--seed", "random_seed", default=42)
+    @click.option("--today", type=click.DateTime(formats=["%Y-%m-%d"]), default=None)
+    def seed_data(providers, customers, services_per_provider, bookings, threads,
+                  messages_per_thread, days, random_seed, today):
+        db.create_all()
+        start = time.perf_counter()
+        counts = seed.generate(
+            providers=providers, customers=customers,
+            services_per_provider=services_per_provider, bookings=bookings,
+            threads=threads, messages_per_thread=messages_per_thread, days=days,
+            seed=random_seed, today=today.date() if today else None)
+        elapsed = time.perf_counter() - start
+
+        for table, rows in counts.items():
+            print(f"{table:<10} {rows:>10}")
+        print(f"Seeded {sum(counts.values())} rows in {elapsed:.1f}s")
+
+    @app.cli.command("proximity-rebuild")
+    def proximity_rebuild():
+        """Reload the proximity engine snapshot from the database."""
+        if not proximity.is_enabled():
+            print("Proximity engine disabled (set PROXIMITY_ENGINE=numpy and install numpy)")
+            return
+        print(f"Proximity index rebuilt with {proximity.rebuild()} providers")
+
+    """
+    Compare the NumPy proximity engine against the per-row haversine loop
+    used by /services/nearby, on synthetic providers around Miami:
+    $ flask bench-proximity --sizes 1000,10000,100000
+    """
+    @app.cli.command("bench-proximity")
+    @click.option("--sizes", default="1000,10000,100000")
+    @click.option("--queries", default=20)
+    @click.option("--radius", default=25.0)
+    def bench_proximity(sizes, queries, radius):
+        from api.routes import haversine_distance
+
+        if proximity.np is None:
+            print("NumPy is not installed")
+            return
+
+        rng = random.Random(42)
+        categories = list(proximity.CATEGORY_BITS)
+        points = [(25.76 + rng.uniform(-1, 1), -80.19 + rng.uniform(-1, 1))
+                  for _ in range(queries)]
+
+        print(f"{'providers':>10} {'loop ms':>10} {'numpy ms':>10} {'speedup':>8}")
+        for size in (int(n) for n in sizes.split(",")):
+            rows = [
+                (i, 25.76 + rng.uniform(-2, 2), -80.19 + rng.uniform(-2, 2),
+                 proximity.CATEGORY_BITS[rng.choice(categories)])
+                for i in range(1, size + 1)
+            ]
+            index = proximity.ProximityIndex()
+            index.load(rows)
+
+            start = time.perf_counter()
+            for lat, lon in points:
+                hits = []
+                for pid, plat, plon, mask in rows:
+                    distance = haversine_distance(lat, lon, plat, plon)
+                    if distance <= radius:
+                        hits.append((pid, distance))
+                hits.sort(key=lambda x: x[1])
+            loop_ms = (time.perf_counter() - start) * 1000 / queries
+
+            start = time.perf_counter()
+            for lat, lon in points:
+                index.nearest(lat, lon, radius)
+            numpy_ms = (time.perf_counter() - start) * 1000 / queries
+
+            print(f"{size:>10} {loop_ms:>10.2f} {numpy_ms:>10.2f} {loop_ms / numpy_ms:>7.1f}x")
+
+    """
+    Compare ORM objects + serialize() against column projections, and
+    Flask's default JSON encoder against FastJSONProvider, for the catalog
+    and booking lists. Seeds data, so point DATABASE_URL at a scratch database:
+    $ DATABASE_URL=sqlite:////tmp/bench.db flask bench-serialize --rows 10000
+    """
+    @app.cli.command("bench-serialize")
+    @click.option("--rows", default=10000)
+    @click.option("--repeat", default=5)
+    def bench_serialize(rows, repeat):
+        from flask.json.provider import DefaultJSONProvider
+        from api.models import Service, Booking, LOAD_PROFILES
+        from api.json_provider import FastJSONProvider, orjson
+
+        db.create_all()
+        if db.session.query(User.id).first() is not None:
+            raise click.ClickException("bench-serialize needs an empty scratch database")
+        seeded = query_budget.seed_dataset(f"bench-{rows}", rows)
+
+        def best_ms(fn):
+            timings = []
+            for _ in range(repeat):
+                db.session.expunge_all()
+                start = time.perf_counter()
+                result = fn()
+                timings.append(time.perf_counter() - start)
+            return min(timings) * 1000, result
+
+        def catalog_orm():
+            results = []
+            for service in Service.query.options(*LOAD_PROFILES['catalog']).order_by(Service.id):
+                data = service.serialize()
+                data['provider'] = {
+                    'id': service.provider.id,
+                    'name': service.provider.name,
+                    'businessName': service.provider.business_name,
+                    'phone': service.provider.phone,
+                    'email': service.provider.user.email,
+                    'city': service.provider.city,
+                    'state': service.provider.state,
+                    'rating': service.provider.rating
+                }
+                results.append(data)
+            return results
+
+        shapes = [
+            ("services", lambda: [s.serialize() for s in Service.query.order_by(Service.id)],
+             lambda: projections.SERVICE.dicts(projections.SERVICE.query().order_by(Service.id))),
+            ("catalog", catalog_orm,
+             lambda: projections.CATALOG_SERVICE.dicts(
+                 projections.CATALOG_SERVICE.query().order_by(Service.id))),
+            ("bookings",
+             lambda: [b.serialize() for b in Booking.query.options(
+                 *LOAD_PROFILES['provider_bookings']).filter_by(
+                 provider_id=seeded['provider_id']).order_by(Booking.id)],
+             lambda: projections.BOOKING.dicts(projections.BOOKING.query().filter(
+                 Booking.provider_id == seeded['provider_id']).order_by(Booking.id))),
+        ]
+
+        default_json = DefaultJSONProvider(app)
+        fast_json = FastJSONProvider(app)
+        if orjson is None:
+            print("orjson is not installed; FastJSONProvider uses the default encoder")
+
+        print(f"{rows} rows, best of {repeat}")
+        print(f"{'list':<10} {'orm ms':>9} {'proj ms':>9} {'speedup':>8} "
+              f"{'json ms':>9} {'fast ms':>9} {'speedup':>8}")
+        for name, orm, projected in shapes:
+            orm_ms, expected = best_ms(orm)
+            proj_ms, actual = best_ms(projected)
+            if actual != expected:
+                raise click.ClickException(f"{name}: projection output differs from serialize()")
+
+            json_ms, _ = best_ms(lambda: default_json.dumps(actual))
+            fast_ms, _ = best_ms(lambda: fast_json.dumps(actual))
+
+            print(f"{name:<10} {orm_ms:>9.1f} {proj_ms:>9.1f} {orm_ms / proj_ms:>7.1f}x "
+                  f"{json_ms:>9.1f} {fast_ms:>9.1f} {json_ms / fast_ms:>7.1f}x")
+
+    """
+    Benchmark the hot endpoints (see api/benchmark.py) and optionally save
+    the results or compare them with an earlier run:
+    $ DATABASE_URL=sqlite:////tmp/bench.db flask bench-endpoints --output bench.json
+    """
+    @app.cli.command("bench-endpoints")
+    @click.option("--requests", "requests_", default=200)
+    @click.option("--concurrency", default=4)
+    @click.option("--only", default=None, help="Comma-separated scenario names")
+    @click.option("--output", type=click.Path(dir_okay=False), default=None)
+    @click.option("--baseline", type=click.File(), default=None)
+    def bench_endpoints(requests_, concurrency, only, output, baseline):
+        scenarios = only.split(",") if only else None
+        unknown = set(scenarios or ()) - set(benchmark.SCENARIOS)
+        if unknown:
+            raise click.ClickException(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        results = benchmark.run(app, requests_, concurrency, scenarios)
+        previous = json.load(baseline)['endpoints'] if baseline else {}
+
+        meta = results['meta']
+        print(f"{meta['dialect']} @ {meta['commit']}, {requests_} requests x {concurrency} threads")
+        print(f"{'endpoint':<18} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'queries':>8} {'errors':>6}" + (f" {'p95 vs base':>12}" if previous else ""))
+        for name, r in results['endpoints'].items():
+            line = (f"{name:<18} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+                    f"{r['p99_ms']:>8.2f} {r['queries_per_request']:>8.2f} {r['errors']:>6}")
+            if name in previous:
+                change = (r['p95_ms'] / previous[name]['p95_ms'] - 1) * 100
+                line += f" {change:>+11.1f}%"
+            print(line)
+
+        if output:
+            with open(output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {output}")
+
+    """
+    Fail when an endpoint's SQL statement count grows with the number of
+    rows it returns or exceeds its budget in api/query_budget.py. Seeds
+    data, so point DATABASE_URL at a scratch database:
+    $ DATABASE_URL=sqlite:////tmp/budget.db flask check-query-budget
+    """
+    @app.cli.command("check-query-budget")
+    @click.option("--rows", default=25)
+    def check_query_budget(rows):
+        db.create_all()
+        if db.session.query(User.id).first() is not None:
+            raise click.ClickException("check-query-budget needs an empty scratch database")
+
+        results = query_budget.check(app, large=rows)
+
+        print(f"{'role':<9}{'endpoint':<55} {'budget':>6} {'small':>6} {'large':>6}")
+        for role, path, budget, small, large, ok in results:
+            flag = "" if ok else "  <-- FAIL"
+            print(f"{role or '-':<9}{path:<55} {budget:>6} {small:>6} {large:>6}{flag}")
+
+        if not all(ok for *_, ok in results):
+            raise SystemExit(1)
+
+    """
+    Deliver queued SMS from the sms_outbox table. Runs until stopped, or
+    drains what is due and exits with --once (e.g. from a cron job):
+    $ flask sms-worker --workers 8
+    """
+    @app.cli.command("sms-worker")
+    @click.option("--once", is_flag=True)
+    @click.option("--batch-size", default=50)
+    @click.option("--workers", default=4)
+    @click.option("--interval", default=2.0)
+    def sms_worker(once, batch_size, workers, interval):
+        from api.sms_service import get_sms_service
+        sms_service = get_sms_service()
+
+        print("SMS worker started")
+        while True:
+            sent, failed = sms_outbox.drain(sms_service, batch_size, workers)
+            if sent or failed:
+                print(f"SMS outbox: {sent} sent, {failed} failed")
+                continue
+            if once:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("rebuild-earnings")
+    def rebuild_earnings():
+        """Recompute provider_daily_earnings from completed bookings."""
+        print(f"Earnings rollup rebuilt: {earnings.rebuild()} provider-days")
+
+    @app.cli.command("search-rebuild")
+    def search_rebuild():
+        """Create the service search index if missing and reindex every service."""
+        search.rebuild()
+        print("Service search index rebuilt")
+
+    """
+    Receive spans from TRACE_EXPORTER=otlp without a real collector and
+    append them to a file in the OTLP/JSON lines format:
+    $ flask trace-collector --port 4318 --output traces.jsonl
+    """
+    @app.cli.command("trace-collector")
+    @click.option("--host", default="127.0.0.1")
+    @click.option("--port", default=4318)
+    @click.option("--output", default="traces.jsonl")
+    def trace_collector(host, port, output):
+        tracing.serve_collector(host, port, output)
+
+    """
+    Fail when a hot endpoint's SQL falls back to a sequential scan. Seeds
+    data, so point DATABASE_URL at a scratch database:
+    $ DATABASE_URL=sqlite:////tmp/plans.db flask check-query-plans
+    """
+    @app.cli.command("check-query-plans")
+    @click.option("--rows", default=200)
+    def check_query_plans(rows):
+        db.create_all()
+        if db.session.query(User.id).first() is not None:
+            raise click.ClickException("check-query-plans needs an empty scratch database")
+
+        problems = query_plans.check(app, rows)
+        for role, path, statement, scans in problems:
+            print(f"{path} ({role or 'public'}): {'; '.join(scans)}")
+            print(f"    {' '.join(statement.split())[:200]}")
+
+        if problems:
+            raise SystemExit(1)
+        print("No sequential scans on hot paths")
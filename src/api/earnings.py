@@ -0,0 +1,91 @@
+"""
+Provider earnings backed by the provider_daily_earnings rollup.
+
+update_booking_status calls record_status_change() in the same transaction
+as the status update, so the rollup only ever moves together with the
+bookings it summarizes. `flask rebuild-earnings` recomputes it from scratch.
+"""
+from datetime import timedelta
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from api.models import db, Booking, ProviderDailyEarnings
+
+UPSERT_DIALECTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def _add_to_day(provider_id, day, amount, count):
+    table = ProviderDailyEarnings.__table__
+    dialect_insert = UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+
+    if dialect_insert is not None:
+        stmt = dialect_insert(table).values(
+            provider_id=provider_id, day=day, total=amount, bookings=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['provider_id', 'day'],
+            set_={
+                'total': table.c.total + stmt.excluded.total,
+                'bookings': table.c.bookings + stmt.excluded.bookings,
+            })
+        db.session.execute(stmt)
+        return
+
+    row = db.session.get(
+        ProviderDailyEarnings, (provider_id, day), with_for_update=True)
+    if row is None:
+        db.session.add(ProviderDailyEarnings(
+            provider_id=provider_id, day=day, total=amount, bookings=count))
+    else:
+        row.total += amount
+        row.bookings += count
+
+
+def record_status_change(booking, old_status):
+    """Move the booking's amount into or out of its day's rollup row."""
+    if old_status == booking.status:
+        return
+    if booking.status == 'completed':
+        _add_to_day(booking.provider_id, booking.booking_date,
+                    booking.total_price, 1)
+    elif old_status == 'completed':
+        _add_to_day(booking.provider_id, booking.booking_date,
+                    -booking.total_price, -1)
+
+
+def summary(provider_id, today):
+    """Today / week / month / total earnings in one pass over the rollup."""
+    week_start = today - timedelta(days=today.weekday())
+    month_start = today.replace(day=1)
+    day, total = ProviderDailyEarnings.day, ProviderDailyEarnings.total
+
+    row = db.session.query(
+        func.sum(case((day == today, total), else_=0.0)),
+        func.sum(case((day >= week_start, total), else_=0.0)),
+        func.sum(case((day >= month_start, total), else_=0.0)),
+        func.sum(total)
+    ).filter(ProviderDailyEarnings.provider_id == provider_id).one()
+
+    return {
+        'today': row[0] or 0.0,
+        'week': row[1] or 0.0,
+        'month': row[2] or 0.0,
+        'total': row[3] or 0.0
+    }
+
+
+def rebuild():
+    """Recompute the whole rollup from completed bookings."""
+    db.session.execute(ProviderDailyEarnings.__table__.delete())
+    completed = select(
+        Booking.provider_id,
+        Booking.booking_date,
+        func.sum(Booking.total_price),
+        func.count(Booking.id)
+    ).where(Booking.status == 'completed').group_by(
+        Booking.provider_id, Booking.booking_date)
+    db.session.execute(insert(ProviderDailyEarnings.__table__).from_select(
+        ['provider_id', 'day', 'total', 'bookings'], completed))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(ProviderDailyEarnings).scalar()
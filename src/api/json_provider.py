@@ -0,0 +1,43 @@
+"""
+Faster JSON encoding for Flask responses.
+
+FastJSONProvider is installed as app.json and encodes with orjson when the
+package is available, otherwise it behaves exactly like Flask's default
+provider. Output stays compatible with the default provider: keys are
+sorted, and dates, decimals, dataclasses and UUIDs go through Flask's own
+default() hook. Anything orjson rejects (e.g. integers above 64 bits) is
+re-encoded with the standard library.
+
+One visible difference: non-ASCII text is sent as UTF-8 rather than
+\\u escapes, which is equivalent JSON.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+
+        option = (orjson.OPT_PASSTHROUGH_DATETIME
+                  | orjson.OPT_PASSTHROUGH_DATACLASS
+                  | orjson.OPT_NON_STR_KEYS)
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+
+        try:
+            return orjson.dumps(obj, default=self.default, option=option).decode()
+        except TypeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
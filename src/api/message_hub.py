@@ -0,0 +1,127 @@
+"""
+Notification hub for long-polled message threads.
+
+send_message / send_provider_message call notify() after committing. A
+long-poll request subscribes to its conversation *before* checking the
+database and then waits on the subscription, so a message committed in
+between is never missed.
+
+Broker is chosen with MESSAGE_BROKER:
+    local (default)  in-process; only wakes requests in the same worker
+    redis            Redis pub/sub via MESSAGE_BROKER_URL, so a message sent
+                     through one gunicorn worker wakes pollers in all of
+                     them. MESSAGE_BROKER_URL=local (or no redis package)
+                     falls back to the in-process broker.
+
+Long-polling parks a worker thread, so run gunicorn with threaded or async
+workers (e.g. --worker-class gthread --threads 8) when clients use ?wait=.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+MAX_WAIT_SECONDS = 30
+
+
+def channel_name(customer_id, provider_id):
+    return f"conversation:{customer_id}:{provider_id}"
+
+
+class LocalBroker:
+    """
+    Per-channel publish counters, kept only while a channel has
+    subscribers; nobody can be waiting on any other channel.
+    """
+
+    def __init__(self):
+        self._sequences = {}
+        self._subscribers = {}
+        self._condition = threading.Condition()
+
+    def publish(self, channel):
+        with self._condition:
+            if channel in self._subscribers:
+                self._sequences[channel] += 1
+                self._condition.notify_all()
+
+    @contextmanager
+    def subscribe(self, channel):
+        with self._condition:
+            self._subscribers[channel] = self._subscribers.get(channel, 0) + 1
+            start = self._sequences.setdefault(channel, 0)
+
+        def wait(timeout):
+            with self._condition:
+                return self._condition.wait_for(
+                    lambda: self._sequences[channel] > start, timeout)
+
+        try:
+            yield wait
+        finally:
+            with self._condition:
+                self._subscribers[channel] -= 1
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+                    del self._sequences[channel]
+
+
+class RedisBroker:
+    def __init__(self, client, prefix='homecalls:'):
+        self.client = client
+        self.prefix = prefix
+
+    def publish(self, channel):
+        self.client.publish(self.prefix + channel, '1')
+
+    @contextmanager
+    def subscribe(self, channel):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(self.prefix + channel)
+
+        def wait(timeout):
+            deadline = time.monotonic() + timeout
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                if pubsub.get_message(timeout=remaining):
+                    return True
+
+        try:
+            yield wait
+        finally:
+            pubsub.close()
+
+
+def broker_from_env():
+    if os.environ.get('MESSAGE_BROKER', 'local') == 'redis':
+        url = os.environ.get('MESSAGE_BROKER_URL', 'local')
+        if redis is not None and url != 'local':
+            return RedisBroker(redis.Redis.from_url(url))
+    return LocalBroker()
+
+
+broker = broker_from_env()
+
+
+def notify(customer_id, provider_id):
+    """Call after committing a new message; never fails the request."""
+    try:
+        broker.publish(channel_name(customer_id, provider_id))
+    except Exception as e:
+        current_app.logger.warning("Message notify failed: %s", e)
+
+
+def subscribe(customer_id, provider_id):
+    """
+    Context manager yielding wait(timeout) -> bool, True once a message
+    has been published to the conversation since subscribing.
+    """
+    return broker.subscribe(channel_name(customer_id, provider_id))
@@ -0,0 +1,386 @@
+"""
+Prometheus-style metrics, exposed at GET /metrics in the text format.
+
+    http_requests_total{method,route,status}        counter
+    http_request_duration_seconds{method,route}     histogram
+    db_pool_checked_out / _checked_in / _overflow / _size   gauges
+    db_pool_wait_seconds                            histogram (connection checkout)
+    sms_messages_total{result}                      counter (sent, rejected, error, circuit_open)
+    sms_send_duration_seconds                       histogram
+    sms_quota_remaining                             gauge
+
+Multiple processes: set METRICS_DIR to a directory shared by every gunicorn
+worker and `flask sms-worker`. Each process writes a snapshot file there
+(at most every METRICS_FLUSH_SECONDS and at exit) named after its pid and
+a random per-process nonce, so a reused pid never overwrites the file of a
+process that has exited. /metrics merges
+them: counters and histograms are summed over all files, so counts from
+workers that have exited are kept; pool gauges are summed over live
+processes only. The directory should be empty when the server starts (a
+tmpfs path such as /tmp/metrics is reset with the container). Without
+METRICS_DIR, /metrics reports the answering process only.
+
+The SMS quota comes from successful sends (TextBelt reports it with every
+message) and, when that value is older than SMS_QUOTA_TTL seconds, from a
+single check_quota() call during a scrape.
+
+Set METRICS_TOKEN to require `Authorization: Bearer <token>` on /metrics.
+In production (FLASK_DEBUG unset) the route only exists when it is set.
+"""
+import atexit
+import copy
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+import weakref
+from flask import g, request, Response, abort
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+SMS_QUOTA_TTL = float(os.environ.get('SMS_QUOTA_TTL', 300))
+
+_lock = threading.Lock()
+_registry = {}
+_last_flush = 0.0
+_process = None
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        _registry[name] = self
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+        _maybe_flush()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self.values = {}
+        _registry[name] = self
+
+    def observe(self, seconds, *labels):
+        with _lock:
+            entry = self.values.get(labels)
+            if entry is None:
+                entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    break
+            else:
+                i = len(self.buckets)
+            entry[0][i] += 1
+            entry[1] += seconds
+            entry[2] += 1
+        _maybe_flush()
+
+
+class Gauge:
+    """
+    Point-in-time value. `merge` says how processes combine: 'sum' adds the
+    values of live processes, 'latest' keeps the most recently set one.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), merge='sum'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.merge = merge
+        # labels -> (value, time set)
+        self.values = {}
+        _registry[name] = self
+
+    def set(self, value, *labels):
+        with _lock:
+            self.values[labels] = (value, time.time())
+
+
+REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status',
+                   ['method', 'route', 'status'])
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency',
+                            ['method', 'route'])
+POOL_CHECKED_OUT = Gauge('db_pool_checked_out', 'Database connections in use')
+POOL_CHECKED_IN = Gauge('db_pool_checked_in', 'Idle database connections in the pool')
+POOL_OVERFLOW = Gauge('db_pool_overflow', 'Connections opened beyond pool_size')
+POOL_SIZE = Gauge('db_pool_size', 'Configured pool_size')
+POOL_WAIT = Histogram('db_pool_wait_seconds', 'Time to check a connection out of the pool',
+                      buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+SMS_MESSAGES = Counter('sms_messages_total', 'SMS send attempts by result', ['result'])
+SMS_LATENCY = Histogram('sms_send_duration_seconds', 'SMS gateway send latency')
+SMS_QUOTA = Gauge('sms_quota_remaining', 'TextBelt quota remaining', merge='latest')
+
+_engines = weakref.WeakSet()
+
+
+def _sample_pools():
+    checked_out = checked_in = overflow = size = 0
+    # Engines may share a pool (the admin borrows the app's); count each once
+    for pool in {id(engine.pool): engine.pool for engine in _engines}.values():
+        checked_out += getattr(pool, 'checkedout', lambda: 0)()
+        checked_in += getattr(pool, 'checkedin', lambda: 0)()
+        overflow += max(getattr(pool, 'overflow', lambda: 0)(), 0)
+        size += getattr(pool, 'size', lambda: 0)()
+    POOL_CHECKED_OUT.set(checked_out)
+    POOL_CHECKED_IN.set(checked_in)
+    POOL_OVERFLOW.set(overflow)
+    POOL_SIZE.set(size)
+
+
+def instrument_engine(engine):
+    """Time pool checkouts. Re-applied when engine.dispose() swaps the pool."""
+    _engines.add(engine)
+
+    pool = engine.pool
+    if getattr(pool, '_metrics_timed', False):
+        return
+    connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - start)
+    pool.connect = timed_connect
+    pool._metrics_timed = True
+
+
+# ============================================
+# Multiprocess snapshots
+# ============================================
+
+def _process_id():
+    """(pid, nonce) of this process; a forked child gets a new nonce."""
+    global _process
+    if _process is None or _process[0] != os.getpid():
+        _process = (os.getpid(), os.urandom(4).hex())
+    return _process
+
+
+def _snapshot():
+    if _engines:
+        _sample_pools()
+    pid, nonce = _process_id()
+    with _lock:
+        return {
+            'pid': pid,
+            'nonce': nonce,
+            'metrics': {
+                name: [[list(labels), copy.deepcopy(value)] for labels, value in metric.values.items()]
+                for name, metric in _registry.items()
+            },
+        }
+
+
+def flush():
+    """Write this process's snapshot to METRICS_DIR (atomically)."""
+    global _last_flush
+    if not METRICS_DIR:
+        return
+    _last_flush = time.monotonic()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, "metrics_{}_{}.json".format(*_process_id()))
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(_snapshot(), f)
+    os.replace(tmp, path)
+
+
+def _maybe_flush():
+    if METRICS_DIR and time.monotonic() - _last_flush >= FLUSH_SECONDS:
+        try:
+            flush()
+        except OSError:
+            pass
+
+
+if METRICS_DIR:
+    atexit.register(flush)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _snapshots():
+    if not METRICS_DIR:
+        return [_snapshot()]
+
+    flush()
+    snapshots = []
+    for path in glob.glob(os.path.join(METRICS_DIR, 'metrics_*.json')):
+        try:
+            with open(path) as f:
+                snapshots.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def collect():
+    """Merge every process's snapshot into {name: {labels: value}}."""
+    merged = {name: {} for name in _registry}
+    pid, nonce = _process_id()
+    for snapshot in _snapshots():
+        if snapshot['pid'] == pid:
+            alive = snapshot.get('nonce') == nonce
+        else:
+            alive = _alive(snapshot['pid'])
+        for name, series in snapshot['metrics'].items():
+            metric = _registry.get(name)
+            if metric is None:
+                continue
+            values = merged[name]
+            for labels, value in series:
+                labels = tuple(labels)
+                if metric.kind == 'counter':
+                    values[labels] = values.get(labels, 0) + value
+                elif metric.kind == 'histogram':
+                    buckets, total, count = values.get(
+                        labels, ([0] * len(value[0]), 0.0, 0))
+                    values[labels] = ([a + b for a, b in zip(buckets, value[0])],
+                                      total + value[1], count + value[2])
+                elif metric.merge == 'latest':
+                    if labels not in values or value[1] > values[labels][1]:
+                        values[labels] = tuple(value)
+                elif alive:
+                    previous = values.get(labels, (0, 0))
+                    values[labels] = (previous[0] + value[0], max(previous[1], value[1]))
+    return merged
+
+
+# ============================================
+# Text exposition
+# ============================================
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value != value:
+        return 'NaN'
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(collected):
+    lines = []
+    for name, values in collected.items():
+        metric = _registry[name]
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for labels, value in sorted(values.items()):
+            if metric.kind == 'histogram':
+                buckets, total, count = value
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (float('inf'),), buckets):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_labels(metric.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(metric.labelnames, labels)} {_number(total)}")
+                lines.append(f"{name}_count{_labels(metric.labelnames, labels)} {count}")
+            elif metric.kind == 'gauge':
+                lines.append(f"{name}{_labels(metric.labelnames, labels)} {_number(value[0])}")
+            else:
+                lines.append(f"{name}{_labels(metric.labelnames, labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================
+# SMS
+# ============================================
+
+def record_sms(result, seconds, quota=None):
+    """
+    Called by SMSService.send_sms; result is 'sent', 'rejected' (the gateway
+    said no), 'error' (transport failure) or 'circuit_open'.
+    """
+    SMS_MESSAGES.inc(result)
+    SMS_LATENCY.observe(seconds)
+    if quota is not None:
+        SMS_QUOTA.set(quota)
+
+
+def _refresh_sms_quota(app, collected):
+    """Re-check the quota when the merged value in `collected` is stale."""
+    current = collected[SMS_QUOTA.name].get(())
+    if current is not None and time.time() - current[1] < SMS_QUOTA_TTL:
+        return
+    # Record the attempt first so a failing gateway is asked at most once per TTL
+    SMS_QUOTA.set(current[0] if current else float('nan'))
+    try:
+        from api.sms_service import get_sms_service
+        SMS_QUOTA.set(get_sms_service().check_quota().get('quotaRemaining', 0))
+    except Exception as e:
+        app.logger.warning("SMS quota check failed: %s", e)
+    with _lock:
+        collected[SMS_QUOTA.name][()] = SMS_QUOTA.values[()]
+
+
+# ============================================
+# Flask wiring
+# ============================================
+
+def setup_metrics(app, endpoint=True):
+    """Record request metrics for `app`; `endpoint` also adds GET /metrics."""
+    from api.models import db
+
+    @app.before_request
+    def start_metrics_timer():
+        g.metrics_start = time.perf_counter()
+        instrument_engine(db.engine)
+
+    @app.after_request
+    def record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is not None and request.endpoint != 'metrics':
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUESTS.inc(request.method, route, str(response.status_code))
+            REQUEST_LATENCY.observe(time.perf_counter() - start, request.method, route)
+        return response
+
+    token = app.config.get('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    if not endpoint or (not token and os.getenv("FLASK_DEBUG") != "1"):
+        return
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        if token and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                             f"Bearer {token}"):
+            abort(401)
+
+        collected = collect()
+        _refresh_sms_quota(app, collected)
+        return Response(render(collected), mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Integer, Float, Text, Date, Time, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Integer, Float, Text, Date, Time, ForeignKey, func
+from sqlalchemy.orm import Mapped, mapped_column, relationship, joinedload
 from datetime import datetime
 from typing import Optional
 
@@ -16,6 +16,8 @@ class User(db.Model):
     role: Mapped[str] = mapped_column(String(50), nullable=False)
     is_active: Mapped[bool] = mapped_column(
         Boolean(), default=True, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
 
     # Relationships
     customer_profile: Mapped[Optional["Customer"]] = relationship(
@@ -34,6 +36,10 @@ class User(db.Model):
 
 class Provider(db.Model):
     __tablename__ = 'providers'
+    __table_args__ = (
+        # Bounding-box prefilter for /services/nearby
+        db.Index('ix_providers_lat_lon', 'latitude', 'longitude'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(
@@ -55,6 +61,8 @@ class Provider(db.Model):
     total_reviews: Mapped[int] = mapped_column(Integer, default=0)
     is_verified: Mapped[bool] = mapped_column(Boolean, default=False)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     user: Mapped["User"] = relationship(back_populates="provider_profile")
@@ -109,6 +117,10 @@ class Customer(db.Model):
 
 class Service(db.Model):
     __tablename__ = 'services'
+    __table_args__ = (
+        db.Index('ix_services_active_category', 'is_active', 'category'),
+        db.Index('ix_services_provider_active', 'provider_id', 'is_active'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     provider_id: Mapped[int] = mapped_column(
@@ -120,6 +132,8 @@ class Service(db.Model):
     duration: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(
+        default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     provider: Mapped["Provider"] = relationship(back_populates="services")
@@ -141,6 +155,19 @@ class Service(db.Model):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        # /provider/bookings and /customer/bookings keyset order
+        db.Index('ix_bookings_provider_date',
+                 'provider_id', 'booking_date', 'booking_time', 'id'),
+        db.Index('ix_bookings_customer_date',
+                 'customer_id', 'booking_date', 'booking_time', 'id'),
+        # ?status= filters and earnings recent transactions
+        db.Index('ix_bookings_provider_status_date',
+                 'provider_id', 'status', 'booking_date'),
+        # /bookings/recent
+        db.Index('ix_bookings_customer_created', 'customer_id', 'created_at'),
+        db.Index('ix_bookings_service', 'service_id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     customer_id: Mapped[int] = mapped_column(
@@ -183,6 +210,14 @@ class Booking(db.Model):
 
 class Message(db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        # Threads, read receipts and the customer's inbox
+        db.Index('ix_messages_customer_provider_created',
+                 'customer_id', 'provider_id', 'created_at'),
+        # The provider's inbox and /provider/messages
+        db.Index('ix_messages_provider_customer',
+                 'provider_id', 'customer_id', 'id'),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     customer_id: Mapped[int] = mapped_column(
@@ -216,3 +251,93 @@ class Message(db.Model):
             'isRead': self.is_read,
             'createdAt': self.created_at.isoformat()
         }
+
+
+class ProviderDailyEarnings(db.Model):
+    """
+    Completed-booking revenue per provider per booking day, kept in step
+    with Booking.status by api.earnings so the dashboard reads O(days).
+    """
+    __tablename__ = 'provider_daily_earnings'
+
+    provider_id: Mapped[int] = mapped_column(
+        ForeignKey('providers.id'), primary_key=True)
+    day: Mapped[datetime.date] = mapped_column(Date, primary_key=True)
+    total: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
+    bookings: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+    def serialize(self):
+        return {
+            'providerId': self.provider_id,
+            'day': self.day.isoformat(),
+            'total': self.total,
+            'bookings': self.bookings
+        }
+
+
+class SmsOutbox(db.Model):
+    __tablename__ = 'sms_outbox'
+    __table_args__ = (
+        db.Index('ix_sms_outbox_status_next_attempt',
+                 'status', 'next_attempt_at'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    booking_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('bookings.id'), nullable=True)
+    phone: Mapped[str] = mapped_column(String(20), nullable=False)
+    message: Mapped[str] = mapped_column(Text, nullable=False)
+    # 'pending', 'sending', 'sent' or 'failed'
+    status: Mapped[str] = mapped_column(String(20), default='pending')
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    sent_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'bookingId': self.booking_id,
+            'phone': self.phone,
+            'status': self.status,
+            'attempts': self.attempts,
+            'lastError': self.last_error,
+            'createdAt': self.created_at.isoformat(),
+            'sentAt': self.sent_at.isoformat() if self.sent_at else None
+        }
+
+
+# ============================================
+# Eager-loading profiles
+# ============================================
+# Each profile lists the relationships a response touches, so list endpoints
+# fetch them in the same query instead of lazy-loading one row at a time.
+# Use as: Booking.query.options(*LOAD_PROFILES['provider_bookings'])
+# Endpoints that select columns instead of entities use api.projections.
+
+LOAD_PROFILES = {
+    # Provider.serialize -> user.email
+    'provider': (
+        joinedload(Provider.user),
+    ),
+    # Booking.serialize -> customer.name, service.name
+    'provider_bookings': (
+        joinedload(Booking.customer),
+        joinedload(Booking.service),
+    ),
+    # /bookings/recent -> service.*, service.provider.*
+    'recent_bookings': (
+        joinedload(Booking.service).joinedload(Service.provider),
+    ),
+    # Message.serialize -> customer.name, provider.name, sender.full_name
+    'messages': (
+        joinedload(Message.customer),
+        joinedload(Message.provider),
+        joinedload(Message.sender),
+    ),
+    # /services -> provider.*, provider.user.email
+    'catalog': (
+        joinedload(Service.provider).joinedload(Provider.user),
+    ),
+}
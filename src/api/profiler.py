@@ -0,0 +1,145 @@
+"""
+On-demand sampling profiler for a live worker.
+
+    $ curl -X POST -H "Authorization: Bearer $PROFILER_TOKEN" \\
+        "https://<host>/debug/profile?seconds=30"
+    {"pid": 4242, "profile": "profile-4242-20260101T120000", "seconds": 30}
+    $ curl -H "Authorization: Bearer $PROFILER_TOKEN" \\
+        https://<host>/debug/profile/profile-4242-20260101T120000 > worker.collapsed
+    $ flamegraph.pl worker.collapsed > worker.svg    # or open it in speedscope
+
+While a profile runs, a background thread reads sys._current_frames() every
+`interval_ms` (default 5) and counts each thread's stack. Results are
+written as collapsed stacks ("thread;frame;frame count" per line). The POST
+returns at once, so a sync gunicorn worker keeps serving and is sampled
+while it does. The result goes to PROFILE_DIR (default <tmp>/profiles),
+so any worker on the host can return it. Add ?wait=1 to block and get the
+stacks in the response instead (dev server, threaded workers).
+
+The routes exist only when PROFILER_TOKEN is set, and they require it as a
+bearer token. Nothing runs between profiles, so idle overhead is zero.
+"""
+import hmac
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import request, jsonify, Response, abort
+
+MAX_SECONDS = 120
+DEFAULT_INTERVAL_MS = 5
+
+PROFILE_NAME = re.compile(r'^profile-\d+-\d{8}T\d{6}$')
+# Shortens frame paths to package-relative ones (flask/app.py, api/routes.py)
+LIBRARY_PREFIX = re.compile(r'^.*[/\\](site-packages|python\d+\.\d+|src)[/\\]')
+
+_running = threading.Lock()
+_labels = {}
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        path = LIBRARY_PREFIX.sub('', code.co_filename)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+def sample(seconds, interval=DEFAULT_INTERVAL_MS / 1000):
+    """Sample every other thread's stack for `seconds`; returns a Counter."""
+    me = threading.get_ident()
+    counts = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            counts[';'.join(reversed(stack))] += 1
+        time.sleep(interval)
+    return counts
+
+
+def collapsed(counts):
+    return ''.join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+def profile_dir():
+    return os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'profiles')
+
+
+def _write_profile(name, seconds, interval):
+    path = os.path.join(profile_dir(), name)
+    try:
+        counts = sample(seconds, interval)
+        with open(f"{path}.partial", 'w') as f:
+            f.write(collapsed(counts))
+        os.replace(f"{path}.partial", f"{path}.collapsed")
+    finally:
+        _running.release()
+
+
+def setup_profiler(app):
+    token = app.config.get('PROFILER_TOKEN', os.environ.get('PROFILER_TOKEN'))
+    if not token:
+        return
+
+    def authorize():
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(401)
+
+    @app.route('/debug/profile', methods=['POST'])
+    def start_profile():
+        authorize()
+        try:
+            seconds = float(request.args.get('seconds', 10))
+            interval = float(request.args.get('interval_ms', DEFAULT_INTERVAL_MS)) / 1000
+        except ValueError:
+            return jsonify({'message': 'seconds and interval_ms must be numbers'}), 400
+        if not 0 < seconds <= MAX_SECONDS or not 0.001 <= interval <= 1:
+            return jsonify({'message': f'seconds must be in (0, {MAX_SECONDS}] '
+                                       'and interval_ms in [1, 1000]'}), 400
+
+        if not _running.acquire(blocking=False):
+            return jsonify({'message': 'A profile is already running in this worker',
+                            'pid': os.getpid()}), 409
+
+        if request.args.get('wait') in ('1', 'true'):
+            try:
+                counts = sample(seconds, interval)
+            finally:
+                _running.release()
+            return Response(collapsed(counts), mimetype='text/plain')
+
+        name = f"profile-{os.getpid()}-{datetime.utcnow():%Y%m%dT%H%M%S}"
+        try:
+            os.makedirs(profile_dir(), exist_ok=True)
+            open(os.path.join(profile_dir(), f"{name}.partial"), 'w').close()
+            threading.Thread(target=_write_profile, args=(name, seconds, interval),
+                             name='profiler', daemon=True).start()
+        except Exception:
+            _running.release()
+            raise
+        return jsonify({'profile': name, 'pid': os.getpid(), 'seconds': seconds}), 202
+
+    @app.route('/debug/profile/<name>', methods=['GET'])
+    def get_profile(name):
+        authorize()
+        if not PROFILE_NAME.match(name):
+            abort(404)
+        path = os.path.join(profile_dir(), name)
+        if os.path.exists(f"{path}.collapsed"):
+            with open(f"{path}.collapsed") as f:
+                return Response(f.read(), mimetype='text/plain')
+        if os.path.exists(f"{path}.partial"):
+            return jsonify({'profile': name, 'status': 'running'}), 202
+        abort(404)
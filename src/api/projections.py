@@ -0,0 +1,202 @@
+"""
+Column projections for list endpoints.
+
+Model.serialize() needs a full ORM object per row: identity-map bookkeeping,
+attribute instrumentation and, for Booking, the related Customer and
+Service objects. A Projection selects only the columns a response uses as
+plain row tuples and maps each tuple straight to the response dict. Keys
+and values match what the serialize() path returned, so clients see no
+difference.
+
+    services, next_cursor = keyset_page(
+        projections.SERVICE.query().filter(...), [Service.id])
+    return jsonify(page_response(projections.SERVICE.dicts(services), next_cursor))
+
+Row attributes are the column keys (labels for joined columns), so the
+sort columns passed to keyset_page must be part of the projection.
+
+Building response dicts counts as serialization: dicts(), serialize_all()
+and anything inside `with serializing(n):` add to the Server-Timing
+`serialize` entry and get a `serialize` trace span with the row count,
+like the JSON encoding that follows.
+"""
+import time
+from contextlib import contextmanager
+from api.models import db, User, Provider, Customer, Service, Booking
+from api import request_timing, tracing
+
+
+@contextmanager
+def serializing(rows):
+    """Time turning `rows` rows into response dicts as 'serialize'."""
+    parent = tracing.current_span()
+    span = parent.child('serialize', attributes={'rows': rows}) if parent else None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_timing.record('serialize', time.perf_counter() - start)
+        if span is not None:
+            span.finish()
+
+
+def serialize_all(objects):
+    """[obj.serialize() for obj in objects], timed by serializing()."""
+    objects = objects if isinstance(objects, list) else list(objects)
+    with serializing(len(objects)):
+        return [obj.serialize() for obj in objects]
+
+
+class Projection:
+    __slots__ = ('columns', 'to_dict', 'joins')
+
+    def __init__(self, columns, to_dict, joins=()):
+        self.columns = columns
+        self.to_dict = to_dict
+        # (target, onclause, outer) tuples applied by query()
+        self.joins = joins
+
+    def query(self):
+        query = db.session.query(*self.columns)
+        for target, onclause, outer in self.joins:
+            query = query.outerjoin(target, onclause) if outer else query.join(target, onclause)
+        return query
+
+    def dicts(self, rows):
+        to_dict = self.to_dict
+        rows = rows if isinstance(rows, list) else list(rows)
+        with serializing(len(rows)):
+            return [to_dict(row) for row in rows]
+
+
+def _service(row):
+    (id, provider_id, name, description, category, price, duration,
+     is_active, created_at) = row
+    return {
+        'id': id,
+        'providerId': provider_id,
+        'name': name,
+        'description': description,
+        'category': category,
+        'price': price,
+        'duration': duration,
+        'isActive': is_active,
+        'createdAt': created_at.isoformat()
+    }
+
+
+SERVICE_COLUMNS = (
+    Service.id, Service.provider_id, Service.name, Service.description,
+    Service.category, Service.price, Service.duration, Service.is_active,
+    Service.created_at
+)
+
+SERVICE = Projection(SERVICE_COLUMNS, _service)
+
+
+def _catalog_service(row):
+    service = _service(row[:9])
+    (name, business_name, phone, email, city, state, rating) = row[9:]
+    service['provider'] = {
+        'id': service['providerId'],
+        'name': name,
+        'businessName': business_name,
+        'phone': phone,
+        'email': email,
+        'city': city,
+        'state': state,
+        'rating': rating
+    }
+    return service
+
+
+# /services: each service with the public part of its provider
+CATALOG_SERVICE = Projection(
+    SERVICE_COLUMNS + (
+        Provider.name.label('provider_name'),
+        Provider.business_name.label('provider_business_name'),
+        Provider.phone.label('provider_phone'),
+        User.email.label('provider_email'),
+        Provider.city.label('provider_city'),
+        Provider.state.label('provider_state'),
+        Provider.rating.label('provider_rating'),
+    ),
+    _catalog_service,
+    joins=(
+        (Provider, Provider.id == Service.provider_id, False),
+        (User, User.id == Provider.user_id, False),
+    )
+)
+
+
+def _booking(row):
+    (id, customer_id, customer_name, provider_id, service_id, service_name,
+     booking_date, booking_time, status, total_price, notes, created_at) = row
+    return {
+        'id': id,
+        'customerId': customer_id,
+        'customerName': customer_name,
+        'providerId': provider_id,
+        'serviceId': service_id,
+        'serviceName': service_name,
+        'date': booking_date.isoformat(),
+        'time': booking_time.strftime('%H:%M'),
+        'status': status,
+        'totalPrice': total_price,
+        'notes': notes,
+        'createdAt': created_at.isoformat()
+    }
+
+
+# Same shape as Booking.serialize()
+BOOKING = Projection(
+    (
+        Booking.id, Booking.customer_id, Customer.name.label('customer_name'),
+        Booking.provider_id, Booking.service_id,
+        Service.name.label('service_name'), Booking.booking_date,
+        Booking.booking_time, Booking.status, Booking.total_price,
+        Booking.notes, Booking.created_at
+    ),
+    _booking,
+    joins=(
+        (Customer, Customer.id == Booking.customer_id, False),
+        (Service, Service.id == Booking.service_id, False),
+    )
+)
+
+
+def _customer_booking(row):
+    (id, category, provider_name, description, booking_date, booking_time,
+     price, duration, status) = row
+
+    if booking_date and booking_time:
+        service_datetime = f"{booking_date.isoformat()}T{booking_time.isoformat()}"
+    else:
+        service_datetime = ""
+
+    return {
+        'id': id,
+        'serviceType': category if category is not None else 'Unknown',
+        'providerName': provider_name if provider_name is not None else 'Unknown',
+        'description': description if category is not None else '',
+        'serviceDate': service_datetime,
+        'price': float(price) if price is not None else 0,
+        'duration': float(duration) if duration else 0,
+        'status': status,
+        'rating': None
+    }
+
+
+# /customer/bookings
+CUSTOMER_BOOKING = Projection(
+    (
+        Booking.id, Service.category, Provider.name.label('provider_name'),
+        Service.description, Booking.booking_date, Booking.booking_time,
+        Service.price, Service.duration, Booking.status
+    ),
+    _customer_booking,
+    joins=(
+        (Service, Service.id == Booking.service_id, True),
+        (Provider, Provider.id == Booking.provider_id, True),
+    )
+)
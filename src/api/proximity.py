@@ -0,0 +1,340 @@
+"""
+In-process proximity engine for /services/nearby.
+
+Every provider with coordinates and at least one active service is kept as
+one row of a compact NumPy record array (id, lat, lon, category bitmask), so
+a radius query is a single vectorized haversine pass plus an argpartition
+top-k instead of a Python loop over ORM objects.
+
+Set PROXIMITY_ENGINE=numpy to enable it. If PROXIMITY_INDEX_PATH is also set
+the array lives in a memory-mapped file (put it on tmpfs, e.g. /dev/shm) and
+every gunicorn worker on the host maps the same pages instead of holding its
+own copy. Without it each worker holds a private copy; writes bump a shared
+"proximity" version (see cache.FileVersions) and every other worker reloads
+its copy from the database on its next query. NumPy is optional: without it the routes keep using the SQL
+bounding-box query.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from api.models import db, Provider, Service
+from api import cache
+
+CATEGORY_BITS = {'pets': 1, 'beauty': 2, 'vehicles': 4, 'home': 8}
+EARTH_RADIUS_MILES = 3956
+
+# The file starts with a fixed-size header whose first int64 is the number
+# of live rows; records follow at HEADER_SIZE.
+HEADER_SIZE = 64
+DEFAULT_CAPACITY = 1024
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ('id', '<i8'),
+        ('lat', '<f8'),
+        ('lon', '<f8'),
+        ('mask', '<u4'),
+    ])
+
+
+def category_mask(categories):
+    mask = 0
+    for category in categories:
+        mask |= CATEGORY_BITS.get(category, 0)
+    return mask
+
+
+class ProximityIndex:
+    """
+    Provider coordinates in a flat record array, optionally file-backed.
+
+    Writers serialize through a thread lock plus an flock on
+    `<path>.lock`; readers never lock and remap when another process has
+    grown or rebuilt the file.
+    """
+
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY):
+        if np is None:
+            raise RuntimeError("NumPy is required for the proximity engine")
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._stat = None
+
+        if path is None:
+            self._header = np.zeros(1, dtype='<i8')
+            self._records = np.zeros(capacity, dtype=RECORD_DTYPE)
+        else:
+            if not os.path.exists(path):
+                with self._write_lock():
+                    if not os.path.exists(path):
+                        self._create_file(path, capacity)
+            self._remap()
+
+    def __len__(self):
+        self._remap()
+        return int(self._header[0])
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _create_file(self, path, capacity, records=None):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        size = HEADER_SIZE + capacity * RECORD_DTYPE.itemsize
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+
+        count = 0 if records is None else len(records)
+        header = np.memmap(tmp_path, dtype='<i8', mode='r+', shape=(1,))
+        header[0] = count
+        header.flush()
+        if count:
+            body = np.memmap(tmp_path, dtype=RECORD_DTYPE, mode='r+',
+                             offset=HEADER_SIZE, shape=(capacity,))
+            body[:count] = records
+            body.flush()
+            del body
+        del header
+
+        os.replace(tmp_path, path)
+
+    def _remap(self):
+        if self.path is None:
+            return
+
+        st = os.stat(self.path)
+        key = (st.st_ino, st.st_size)
+        if key == self._stat:
+            return
+
+        capacity = (st.st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self._header = np.memmap(self.path, dtype='<i8', mode='r+', shape=(1,))
+        self._records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r+',
+                                  offset=HEADER_SIZE, shape=(capacity,))
+        self._stat = key
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            if self.path is None or fcntl is None:
+                yield
+                return
+
+            with open(f"{self.path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _replace(self, records, capacity):
+        if self.path is None:
+            self._records = np.zeros(capacity, dtype=RECORD_DTYPE)
+            self._records[:len(records)] = records
+            self._header[0] = len(records)
+        else:
+            self._create_file(self.path, capacity, records)
+            self._remap()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def load(self, rows):
+        """Replace the whole snapshot with `rows` of (id, lat, lon, mask)."""
+        records = np.array(list(rows), dtype=RECORD_DTYPE)
+        capacity = max(DEFAULT_CAPACITY, 2 * len(records))
+        with self._write_lock():
+            self._replace(records, capacity)
+
+    def upsert(self, provider_id, lat, lon, mask):
+        """
+        Insert or update one provider. A provider without coordinates or
+        without any active category is removed instead.
+        """
+        if lat is None or lon is None or not mask:
+            self.remove(provider_id)
+            return
+
+        with self._write_lock():
+            self._remap()
+            count = int(self._header[0])
+            found = np.flatnonzero(self._records['id'][:count] == provider_id)
+
+            if found.size:
+                slot = found[0]
+            else:
+                if count == len(self._records):
+                    self._replace(self._records[:count].copy(), 2 * count)
+                slot = count
+
+            self._records[slot] = (provider_id, lat, lon, mask)
+            if slot == count:
+                self._header[0] = count + 1
+
+    def remove(self, provider_id):
+        with self._write_lock():
+            self._remap()
+            count = int(self._header[0])
+            found = np.flatnonzero(self._records['id'][:count] == provider_id)
+            if not found.size:
+                return
+
+            # Keep rows dense: move the last row into the freed slot.
+            last = count - 1
+            self._records[found[0]] = self._records[last]
+            self._header[0] = last
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+
+    def nearest(self, lat, lon, radius, category=None, limit=None):
+        """
+        Return [(provider_id, distance_miles), ...] within `radius` miles,
+        closest first, optionally restricted to one category and capped at
+        `limit` results.
+        """
+        self._remap()
+        rows = self._records[:int(self._header[0])]
+
+        if category:
+            rows = rows[(rows['mask'] & CATEGORY_BITS.get(category, 0)) != 0]
+
+        if not len(rows):
+            return []
+
+        lat1 = np.radians(lat)
+        lon1 = np.radians(lon)
+        lat2 = np.radians(rows['lat'])
+        lon2 = np.radians(rows['lon'])
+
+        a = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        distances = 2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS_MILES
+
+        within = np.flatnonzero(distances <= radius)
+        if limit is not None and within.size > limit:
+            top = np.argpartition(distances[within], limit - 1)[:limit]
+            within = within[top]
+
+        within = within[np.argsort(distances[within], kind='stable')]
+
+        ids = rows['id'][within]
+        return [(int(pid), float(d)) for pid, d in zip(ids, distances[within])]
+
+
+# ============================================
+# Shared instance wired to the database
+# ============================================
+
+_index = None
+_index_lock = threading.Lock()
+_versions = None
+_seen_version = None
+
+
+def is_enabled():
+    return np is not None and os.environ.get('PROXIMITY_ENGINE') == 'numpy'
+
+
+def _snapshot_rows():
+    rows = db.session.query(
+        Provider.id, Provider.latitude, Provider.longitude, Service.category
+    ).join(Service, Service.provider_id == Provider.id).filter(
+        Service.is_active.is_(True),
+        Provider.latitude.isnot(None),
+        Provider.longitude.isnot(None)
+    ).distinct()
+
+    providers = {}
+    for provider_id, lat, lon, category in rows:
+        entry = providers.setdefault(provider_id, [lat, lon, 0])
+        entry[2] |= CATEGORY_BITS.get(category, 0)
+
+    return [(pid, lat, lon, mask) for pid, (lat, lon, mask) in providers.items()]
+
+
+def _version_store():
+    global _versions
+    if _versions is None:
+        _versions = cache.FileVersions(cache.VERSION_DIR)
+    return _versions
+
+
+def _changed():
+    """Tell workers holding a private index to reload it."""
+    if _index is not None and _index.path is None:
+        _version_store().bump('proximity')
+
+
+def get_index():
+    """
+    Return the process-wide index, loading it from the database the first
+    time. A shared file that another worker already populated is reused; a
+    private index is reloaded when another worker changed the data.
+    """
+    global _index, _seen_version
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = ProximityIndex(os.environ.get('PROXIMITY_INDEX_PATH'))
+                if index.path is None:
+                    _seen_version = _version_store().version('proximity')
+                if len(index) == 0:
+                    index.load(_snapshot_rows())
+                _index = index
+
+    if _index.path is None:
+        version = _version_store().version('proximity')
+        if version != _seen_version:
+            with _index_lock:
+                if version != _seen_version:
+                    # Read the version first: a bump during the load triggers another
+                    _index.load(_snapshot_rows())
+                    _seen_version = version
+    return _index
+
+
+def rebuild():
+    index = get_index()
+    index.load(_snapshot_rows())
+    _changed()
+    return len(index)
+
+
+def refresh_provider(provider_id):
+    """Re-read one provider's coordinates and active categories."""
+    if not is_enabled():
+        return
+
+    provider = db.session.get(Provider, provider_id)
+    if provider is None:
+        get_index().remove(provider_id)
+        _changed()
+        return
+
+    categories = db.session.query(Service.category).filter(
+        Service.provider_id == provider_id,
+        Service.is_active.is_(True)
+    ).distinct()
+
+    get_index().upsert(
+        provider_id,
+        provider.latitude,
+        provider.longitude,
+        category_mask(category for (category,) in categories)
+    )
+    _changed()
@@ -0,0 +1,151 @@
+"""
+SQL query-count budgets for the API endpoints.
+
+Every endpoint below is called against a small and a large seeded dataset.
+The number of statements must be the same for both sizes, which means no
+per-row lazy loads, and must stay within the declared budget. Run it in CI
+against a scratch database:
+
+    $ DATABASE_URL=sqlite:////tmp/budget.db flask check-query-budget
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from api.models import db, User, Provider, Customer, Service, Booking, Message
+from api import cache
+
+# (role, path, budget). Paths are formatted with the seeded ids. Budgets
+# for authenticated routes include one cold auth-status lookup, and those
+# with conditional GET include the ETag validator query.
+ENDPOINT_BUDGETS = [
+    ('provider', '/api/provider/profile', 3),
+    ('provider', '/api/provider/services', 2),
+    ('provider', '/api/provider/bookings', 2),
+    ('provider', '/api/provider/earnings', 3),
+    ('provider', '/api/provider/messages', 3),
+    ('provider', '/api/messages/provider/{customer_id}', 3),
+    ('customer', '/api/customer/bookings', 2),
+    ('customer', '/api/messages/{provider_id}', 3),
+    ('provider', '/api/conversations', 1),
+    ('customer', '/api/conversations', 1),
+    (None, '/api/services', 2),
+    (None, '/api/services/nearby?lat=25.76&lon=-80.19&radius=5', 1),
+    (None, '/api/providers/{provider_id}', 1),
+    (None, '/api/providers/{provider_id}/services', 3),
+]
+
+
+class QueryCounter:
+    """
+    Count statements sent to the database inside a `with` block, keeping
+    (statement, parameters, executemany) for each.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters, executemany))
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def seed_dataset(tag, rows):
+    """
+    Create one provider and one customer with `rows` services, bookings and
+    messages between them. Returns the ids and login emails.
+    """
+    provider_user = User(full_name=f"Provider {tag}", email=f"budget-provider-{tag}@test.com",
+                         password="budget", role="provider", is_active=True)
+    customer_user = User(full_name=f"Customer {tag}", email=f"budget-customer-{tag}@test.com",
+                         password="budget", role="customer", is_active=True)
+    db.session.add_all([provider_user, customer_user])
+    db.session.flush()
+
+    provider = Provider(user_id=provider_user.id, name=provider_user.full_name,
+                        business_name=provider_user.full_name,
+                        latitude=25.76, longitude=-80.19)
+    customer = Customer(user_id=customer_user.id, name=customer_user.full_name)
+    db.session.add_all([provider, customer])
+    db.session.flush()
+
+    services = [Service(provider_id=provider.id, name=f"Service {i}", category="pets",
+                        price=10.0 + i, is_active=True) for i in range(rows)]
+    db.session.add_all(services)
+    db.session.flush()
+
+    today = datetime.utcnow().date()
+    for i, service in enumerate(services):
+        db.session.add(Booking(
+            customer_id=customer.id, provider_id=provider.id, service_id=service.id,
+            booking_date=today - timedelta(days=i), booking_time=datetime.utcnow().time(),
+            status="completed", total_price=service.price))
+        sender = customer_user if i % 2 else provider_user
+        db.session.add(Message(
+            customer_id=customer.id, provider_id=provider.id, sender_id=sender.id,
+            sender_type=sender.role, message=f"Message {i}", is_read=False))
+
+    db.session.commit()
+
+    return {
+        'provider_id': provider.id,
+        'customer_id': customer.id,
+        'provider': provider_user.email,
+        'customer': customer_user.email,
+    }
+
+
+def _login(client, email, role):
+    response = client.post('/api/login', json={
+        'username': email, 'password': 'budget', 'role': role})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def measure(app, dataset):
+    """Return {(role, path): QueryCounter} for one seeded dataset."""
+    client = app.test_client()
+    headers = {
+        'provider': _login(client, dataset['provider'], 'provider'),
+        'customer': _login(client, dataset['customer'], 'customer'),
+        None: {},
+    }
+
+    counts = {}
+    for role, path, budget in ENDPOINT_BUDGETS:
+        # A fresh app context gives each request its own session, so nothing
+        # is served from an identity map left over by an earlier request.
+        with app.app_context(), QueryCounter(db.engine) as counter:
+            response = client.get(path.format(**dataset), headers=headers[role])
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+        counts[role, path] = counter
+    return counts
+
+
+def check(app, small=2, large=25):
+    """
+    Seed two datasets and compare statement counts. Returns a list of
+    (role, path, budget, small_count, large_count, ok) tuples.
+    """
+    # Measure the database work itself, not response-cache hits.
+    backend, cache.backend = cache.backend, None
+    try:
+        small_counts = measure(app, seed_dataset(f"small-{small}", small))
+        large_counts = measure(app, seed_dataset(f"large-{large}", large))
+    finally:
+        cache.backend = backend
+
+    results = []
+    for role, path, budget in ENDPOINT_BUDGETS:
+        small_count = small_counts[role, path].count
+        large_count = large_counts[role, path].count
+        results.append((role, path, budget, small_count, large_count,
+                        small_count == large_count and large_count <= budget))
+    return results
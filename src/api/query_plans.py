@@ -0,0 +1,82 @@
+"""
+EXPLAIN every statement the hot endpoints issue and flag sequential scans.
+
+Uses the endpoints and seeded data of api.query_budget, captures the SQL
+each request really sends, and asks the database for its plan:
+
+    SQLite    EXPLAIN QUERY PLAN; any "SCAN <table>" step is a full scan
+    Postgres  EXPLAIN (FORMAT JSON) with enable_seqscan off, so a
+              "Seq Scan" left in the plan means no usable index exists
+              (on a small seed the planner would otherwise prefer seq
+              scans everywhere)
+
+    $ DATABASE_URL=sqlite:////tmp/plans.db flask check-query-plans
+"""
+from api.models import db
+from api import cache, query_budget
+
+HOT_TABLES = {table.name for table in db.metadata.sorted_tables}
+
+
+def _sqlite_scans(conn, statement, parameters):
+    rows = conn.exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = []
+    for row in rows:
+        words = row[-1].split()
+        if len(words) >= 2 and words[0] == 'SCAN' and words[1] in HOT_TABLES:
+            scans.append(row[-1])
+    return scans
+
+
+def _postgres_scans(conn, statement, parameters):
+    conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    plan = conn.exec_driver_sql(
+        f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+
+    scans = []
+    nodes = [plan[0]['Plan']]
+    while nodes:
+        node = nodes.pop()
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in HOT_TABLES:
+            scans.append(f"Seq Scan on {node['Relation Name']}")
+        nodes.extend(node.get('Plans', []))
+    return scans
+
+
+EXPLAINERS = {
+    'sqlite': _sqlite_scans,
+    'postgresql': _postgres_scans,
+}
+
+
+def check(app, rows=200):
+    """
+    Seed one dataset, call every endpoint and EXPLAIN what it ran.
+    Returns a list of (role, path, statement, scans) for each offending statement.
+    """
+    explain = EXPLAINERS.get(db.engine.dialect.name)
+    if explain is None:
+        raise RuntimeError(f"No EXPLAIN support for {db.engine.dialect.name}")
+
+    backend, cache.backend = cache.backend, None
+    try:
+        captured = query_budget.measure(
+            app, query_budget.seed_dataset(f"plans-{rows}", rows))
+    finally:
+        cache.backend = backend
+
+    problems = []
+    with db.engine.connect() as conn:
+        for (role, path), counter in captured.items():
+            for statement, parameters, executemany in counter.statements:
+                if executemany or statement.lstrip().upper().startswith('INSERT'):
+                    continue
+                transaction = conn.begin()
+                try:
+                    scans = explain(conn, statement, parameters)
+                finally:
+                    transaction.rollback()
+                if scans:
+                    problems.append((role, path, statement, scans))
+    return problems
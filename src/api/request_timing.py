@@ -0,0 +1,136 @@
+"""
+Per-request timing: SQL, JSON serialization and outbound HTTP.
+
+setup_request_timing(app) hooks SQLAlchemy's before/after_cursor_execute
+and the request lifecycle. Each response gets a Server-Timing header
+(visible in the browser's network panel):
+
+    Server-Timing: db;dur=12.4;desc="5 queries", db-slowest;dur=6.1,
+                   serialize;dur=0.8, http;dur=0.0, total;dur=21.7
+
+`serialize` covers building the response dicts (api.projections.serializing)
+and JSON encoding.
+
+Requests slower than SLOW_REQUEST_MS (default 500) are logged with the
+statements they ran (text and duration, never parameters).
+
+Other code adds time with record(name, seconds); outside a request it is a
+no-op. Config (app.config, falling back to the environment):
+    REQUEST_TIMING     0 disables everything
+    SERVER_TIMING      0 keeps the slow log but drops the header
+    SLOW_REQUEST_MS    slow-request threshold
+"""
+import os
+import time
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+MAX_CAPTURED_STATEMENTS = 50
+
+
+class RequestTiming:
+    __slots__ = ('start', 'queries', 'sql', 'slowest', 'statements', 'totals')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.slowest = (0.0, None)
+        self.statements = []
+        self.totals = {'serialize': 0.0, 'http': 0.0}
+
+    def add_statement(self, statement, seconds):
+        self.queries += 1
+        self.sql += seconds
+        if seconds > self.slowest[0]:
+            self.slowest = (seconds, statement)
+        if len(self.statements) < MAX_CAPTURED_STATEMENTS:
+            self.statements.append((seconds, statement))
+
+    def server_timing(self, total):
+        parts = [
+            f'db;dur={self.sql * 1000:.1f};desc="{self.queries} queries"',
+            f'db-slowest;dur={self.slowest[0] * 1000:.1f}',
+        ]
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.totals.items()]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(parts)
+
+
+def current():
+    return g.get('request_timing') if has_app_context() else None
+
+
+def record(name, seconds):
+    """Add `seconds` to a named bucket (e.g. 'http') of the current request."""
+    timing = current()
+    if timing is not None:
+        timing.totals[name] = timing.totals.get(name, 0.0) + seconds
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current() is not None:
+        conn.info['request_timing_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = current()
+    start = conn.info.pop('request_timing_start', None)
+    if timing is not None and start is not None:
+        timing.add_statement(statement, time.perf_counter() - start)
+
+
+def _flag(app, name, default):
+    return str(app.config.get(name, os.environ.get(name, default))) not in ('0', 'false', 'False')
+
+
+def setup_request_timing(app):
+    if not _flag(app, 'REQUEST_TIMING', '1'):
+        return
+
+    threshold = float(app.config.get(
+        'SLOW_REQUEST_MS', os.environ.get('SLOW_REQUEST_MS', 500))) / 1000
+    send_header = _flag(app, 'SERVER_TIMING', '1')
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    # Time JSON encoding wherever it happens (jsonify, streamed batches)
+    dumps = app.json.dumps
+
+    def timed_dumps(obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return dumps(obj, **kwargs)
+        finally:
+            record('serialize', time.perf_counter() - start)
+    app.json.dumps = timed_dumps
+
+    @app.before_request
+    def start_request_timing():
+        g.request_timing = RequestTiming()
+
+    @app.after_request
+    def finish_request_timing(response):
+        timing = g.pop('request_timing', None)
+        if timing is None:
+            return response
+
+        total = time.perf_counter() - timing.start
+        if send_header:
+            response.headers['Server-Timing'] = timing.server_timing(total)
+
+        if total >= threshold:
+            statements = "\n".join(
+                f"    {seconds * 1000:8.1f} ms  {' '.join(statement.split())[:300]}"
+                for seconds, statement in timing.statements)
+            app.logger.warning(
+                "Slow request %s %s -> %s in %.1f ms (%d queries, %.1f ms SQL, "
+                "serialize %.1f ms, http %.1f ms)\n%s",
+                request.method, request.full_path.rstrip('?'), response.status_code,
+                total * 1000, timing.queries, timing.sql * 1000,
+                timing.totals['serialize'] * 1000, timing.totals['http'] * 1000,
+                statements)
+        return response
@@ -1,10 +1,21 @@
-from flask import Flask, request, jsonify, Blueprint
-from api.models import db, User, Provider, Customer, Service, Booking, Message
+from flask import Flask, request, jsonify, Blueprint, g
+from api.models import (
+    db, User, Provider, Customer, Service, Booking, Message, LOAD_PROFILES
+)
 from api.utils import (
     generate_sitemap,
     APIException,
     provider_required,
-    customer_required
+    customer_required,
+    profile_required,
+    current_profile,
+    profile_claims,
+    keyset_page,
+    page_response,
+    wants_stream,
+    stream_json,
+    page_limit,
+    MAX_PAGE_SIZE
 )
 from flask_cors import CORS
 from flask_jwt_extended import (
@@ -12,10 +23,13 @@ from flask_jwt_extended import (
     get_jwt_identity,
     jwt_required
 )
-from datetime import datetime, timedelta
-from sqlalchemy import func
-from math import radians, cos, sin, asin, sqrt
-from api.sms_service import sms_service
+from datetime import datetime
+from sqlalchemy import func, case
+from sqlalchemy.orm import contains_eager
+from math import radians, cos, sin, asin, sqrt, isfinite
+from api.sms_service import SMSService
+from api.sms_outbox import enqueue_sms
+from api import proximity, cache, earnings, message_hub, search, projections
 
 api = Blueprint("api", __name__)
 CORS(api)
@@ -41,7 +55,8 @@ def create_token():
     if user.role != role:
         return jsonify({"message": f"You are not registered as a {role}"}), 403
 
-    access_token = create_access_token(identity=str(user.id))
+    access_token = create_access_token(
+        identity=str(user.id), additional_claims=profile_claims(user))
 
     return jsonify({
         "message": "Login successful",
@@ -94,27 +109,24 @@ def signup():
     return jsonify({"message": "User created successfully!"}), 201
 
 
-def get_current_provider():
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-    provider = Provider.query.filter_by(user_id=user_id).first()
+def latest(*timestamps):
+    present = [t for t in timestamps if t is not None]
+    return max(present) if present else None
 
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
 
-    return provider
+def provider_profile_validator():
+    provider_id = g.current_profile_id
+    updated_at = tuple(db.session.query(Provider.updated_at, User.updated_at).join(
+        Provider.user).filter(Provider.id == provider_id).first() or ())
+    return (provider_id, updated_at), latest(*updated_at)
 
 
 @api.route('/provider/profile', methods=['GET'])
 @jwt_required()
 @provider_required()
+@cache.conditional(provider_profile_validator)
 def get_provider_profile():
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-    provider = Provider.query.filter_by(user_id=user_id).first()
-
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    provider = current_profile(*LOAD_PROFILES['provider'])
 
     return jsonify(provider.serialize()), 200
 
@@ -123,9 +135,7 @@ def get_provider_profile():
 @jwt_required()
 @provider_required()
 def update_provider_profile():
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
+    provider = current_profile()
 
     data = request.get_json() or {}
 
@@ -138,7 +148,10 @@ def update_provider_profile():
     provider.state = data.get("state", provider.state)
     provider.zip_code = data.get("zipCode", provider.zip_code)
 
+    if 'name' in data or 'businessName' in data:
+        search.index_provider(provider.id)
     db.session.commit()
+    cache.invalidate_provider(provider.id)
 
     return jsonify({
         "message": "Profile updated successfully",
@@ -150,12 +163,7 @@ def update_provider_profile():
 @jwt_required()
 @provider_required()
 def update_provider_location():
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-    provider = Provider.query.filter_by(user_id=user_id).first()
-
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    provider = current_profile()
 
     data = request.get_json()
 
@@ -172,6 +180,8 @@ def update_provider_location():
         provider.zip_code = data['zipCode']
 
     db.session.commit()
+    proximity.refresh_provider(provider.id)
+    cache.invalidate_provider(provider.id)
 
     return jsonify({
         'message': 'Location updated successfully',
@@ -183,24 +193,20 @@ def update_provider_location():
 @jwt_required()
 @provider_required()
 def get_provider_services():
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
+    provider_id = g.current_profile_id
 
-    services = Service.query.filter_by(provider_id=provider.id).all()
-    return jsonify([s.serialize() for s in services]), 200
+    services, next_cursor = keyset_page(
+        projections.SERVICE.query().filter(Service.provider_id == provider_id),
+        [Service.id])
+    return jsonify(page_response(
+        projections.SERVICE.dicts(services), next_cursor)), 200
 
 
 @api.route('/provider/services', methods=['POST'])
 @jwt_required()
 @provider_required()
 def create_service():
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-    provider = Provider.query.filter_by(user_id=user_id).first()
-
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    provider_id = g.current_profile_id
 
     data = request.get_json()
 
@@ -214,7 +220,7 @@ def create_service():
         return jsonify({'message': 'Invalid category'}), 400
 
     new_service = Service(
-        provider_id=provider.id,
+        provider_id=provider_id,
         name=data['name'],
         description=data.get('description', ''),
         category=data['category'],
@@ -224,7 +230,10 @@ def create_service():
     )
 
     db.session.add(new_service)
+    search.index_service(new_service)
     db.session.commit()
+    proximity.refresh_provider(provider_id)
+    cache.invalidate_provider(provider_id)
 
     return jsonify({
         'message': 'Service created successfully',
@@ -236,12 +245,10 @@ def create_service():
 @jwt_required()
 @provider_required()
 def update_service(service_id):
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
+    provider_id = g.current_profile_id
 
     service = Service.query.filter_by(
-        id=service_id, provider_id=provider.id).first()
+        id=service_id, provider_id=provider_id).first()
     if not service:
         return jsonify({"message": "Service not found"}), 404
 
@@ -251,7 +258,10 @@ def update_service(service_id):
         if field in data:
             setattr(service, field, data[field])
 
+    search.index_service(service)
     db.session.commit()
+    proximity.refresh_provider(provider_id)
+    cache.invalidate_provider(provider_id)
 
     return jsonify({
         "message": "Service updated successfully",
@@ -263,41 +273,54 @@ def update_service(service_id):
 @jwt_required()
 @provider_required()
 def delete_service(service_id):
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
-
-    service = Service.query.filter_by(
-        id=service_id, provider_id=provider.id).first()
-    if not service:
+    provider_id = g.current_profile_id
+
+    # Bookings keep pointing at their service (and SQLite does not enforce
+    # the foreign key), so a booked service is deactivated, not deleted
+    has_bookings = db.session.query(
+        Booking.query.filter_by(service_id=service_id, provider_id=provider_id).exists()).scalar()
+    if has_bookings:
+        return jsonify({"message": "Service has bookings; set is_active to false instead"}), 409
+
+    deleted = Service.query.filter_by(
+        id=service_id, provider_id=provider_id
+    ).delete(synchronize_session=False)
+    if not deleted:
         return jsonify({"message": "Service not found"}), 404
 
-    db.session.delete(service)
+    search.remove_service(service_id)
     db.session.commit()
+    proximity.refresh_provider(provider_id)
+    cache.invalidate_provider(provider_id)
 
-    return jsonify({"message": "Service deleted successfully"}), 200
+    return jsonify({"message": "Service deleted successfully", "deleted": deleted}), 200
 
 
 @api.route("/provider/bookings", methods=["GET"])
 @jwt_required()
 @provider_required()
 def get_provider_bookings():
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
+    provider_id = g.current_profile_id
 
     status = request.args.get("status")
-    query = Booking.query.filter_by(provider_id=provider.id)
+    query = projections.BOOKING.query().filter(Booking.provider_id == provider_id)
 
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Booking.status == status)
 
-    bookings = query.order_by(
-        Booking.booking_date.desc(),
-        Booking.booking_time.desc()
-    ).all()
+    if wants_stream():
+        return stream_json(query.order_by(
+            Booking.booking_date.desc(), Booking.booking_time.desc(), Booking.id.desc()
+        ), projections.BOOKING.to_dict)
 
-    return jsonify([b.serialize() for b in bookings]), 200
+    bookings, next_cursor = keyset_page(
+        query,
+        [Booking.booking_date, Booking.booking_time, Booking.id],
+        descending=True
+    )
+
+    return jsonify(page_response(
+        projections.BOOKING.dicts(bookings), next_cursor)), 200
 
 
 @api.route("/customer/bookings", methods=["GET"])
@@ -307,54 +330,35 @@ def get_customer_bookings():
     """
     Get all bookings for the logged-in customer with service and provider details
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
+    customer_id = g.current_profile_id
 
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
-
-    bookings = Booking.query.filter_by(customer_id=customer.id).order_by(
-        Booking.booking_date.desc(),
-        Booking.booking_time.desc()
-    ).all()
-
-    bookings_data = []
-    for booking in bookings:
-        service = booking.service
-        provider = booking.provider
-
-        if booking.booking_date and booking.booking_time:
-            service_datetime = f"{booking.booking_date.isoformat()}T{booking.booking_time.isoformat()}"
-        else:
-            service_datetime = ""
-
-        booking_data = {
-            'id': booking.id,
-            'serviceType': service.category if service else 'Unknown',
-            'providerName': provider.name if provider else 'Unknown',
-            'description': service.description if service else '',
-            'serviceDate': service_datetime,
-            'price': float(service.price) if service else 0,
-            'duration': float(service.duration) if service and service.duration else 0,
-            'status': booking.status,
-            'rating': None
-        }
-        bookings_data.append(booking_data)
-
-    return jsonify(bookings_data), 200
+    query = projections.CUSTOMER_BOOKING.query().filter(
+        Booking.customer_id == customer_id)
+
+    if wants_stream():
+        return stream_json(query.order_by(
+            Booking.booking_date.desc(), Booking.booking_time.desc(), Booking.id.desc()
+        ), projections.CUSTOMER_BOOKING.to_dict)
+
+    bookings, next_cursor = keyset_page(
+        query,
+        [Booking.booking_date, Booking.booking_time, Booking.id],
+        descending=True
+    )
+
+    return jsonify(page_response(
+        projections.CUSTOMER_BOOKING.dicts(bookings), next_cursor)), 200
 
 
 @api.route("/provider/bookings/<int:booking_id>", methods=["GET"])
 @jwt_required()
 @provider_required()
 def get_booking_details(booking_id):
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
+    provider_id = g.current_profile_id
 
-    booking = Booking.query.filter_by(
-        id=booking_id, provider_id=provider.id).first()
+    booking = Booking.query.options(
+        *LOAD_PROFILES['provider_bookings']
+    ).filter_by(id=booking_id, provider_id=provider_id).first()
     if not booking:
         return jsonify({"message": "Booking not found"}), 404
 
@@ -365,14 +369,7 @@ def get_booking_details(booking_id):
 @jwt_required()
 @provider_required()
 def update_booking_status(booking_id):
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
-
-    booking = Booking.query.filter_by(
-        id=booking_id, provider_id=provider.id).first()
-    if not booking:
-        return jsonify({"message": "Booking not found"}), 404
+    provider_id = g.current_profile_id
 
     data = request.get_json() or {}
     status = data.get("status")
@@ -380,8 +377,16 @@ def update_booking_status(booking_id):
     if status not in ["pending", "confirmed", "completed", "cancelled"]:
         return jsonify({"message": "Invalid status"}), 400
 
+    # Row lock so concurrent status changes can't double-count earnings
+    booking = Booking.query.filter_by(
+        id=booking_id, provider_id=provider_id).with_for_update().first()
+    if not booking:
+        return jsonify({"message": "Booking not found"}), 404
+
+    old_status = booking.status
     booking.status = status
     booking.updated_at = datetime.utcnow()
+    earnings.record_status_change(booking, old_status)
 
     db.session.commit()
 
@@ -395,71 +400,62 @@ def update_booking_status(booking_id):
 @jwt_required()
 @provider_required()
 def get_earnings():
-    provider = get_current_provider()
-    if not provider:
-        return jsonify({"message": "Provider profile not found"}), 404
-
-    today = datetime.utcnow().date()
-    week_start = today - timedelta(days=today.weekday())
-    month_start = today.replace(day=1)
-
-    def sum_for(filter_expr):
-        return db.session.query(func.sum(Booking.total_price)).filter(
-            Booking.provider_id == provider.id,
-            Booking.status == "completed",
-            *filter_expr
-        ).scalar() or 0.0
+    provider_id = g.current_profile_id
 
-    earnings_today = sum_for([Booking.booking_date == today])
-    earnings_week = sum_for([Booking.booking_date >= week_start])
-    earnings_month = sum_for([Booking.booking_date >= month_start])
-    earnings_total = sum_for([])
+    totals = earnings.summary(provider_id, datetime.utcnow().date())
 
-    recent = Booking.query.filter_by(
-        provider_id=provider.id, status="completed"
-    ).order_by(Booking.booking_date.desc()).limit(10)
+    recent = Booking.query.options(
+        *LOAD_PROFILES['provider_bookings']
+    ).filter_by(
+        provider_id=provider_id, status="completed"
+    ).order_by(Booking.booking_date.desc(), Booking.id.desc()).limit(10).all()
 
     return jsonify({
-        "today": earnings_today,
-        "week": earnings_week,
-        "month": earnings_month,
-        "total": earnings_total,
-        "recentTransactions": [b.serialize() for b in recent]
+        **totals,
+        "recentTransactions": projections.serialize_all(recent)
     }), 200
 
 
+def catalog_summary():
+    """ETag parts for /services without a cache backend; no Last-Modified,
+    since deactivating or deleting a service leaves no newer timestamp."""
+    query = db.session.query(
+        func.count(Service.id),
+        func.max(Service.id),
+        func.max(Service.updated_at),
+        func.max(Provider.updated_at),
+        func.max(User.updated_at)
+    ).join(Service.provider).join(Provider.user).filter(Service.is_active.is_(True))
+
+    category = request.args.get('category')
+    if category:
+        query = query.filter(Service.category == category)
+
+    return tuple(query.one()), None
+
+
 @api.route('/services', methods=['GET'])
+@cache.conditional(cache.scope_validator(lambda: ['catalog'], catalog_summary))
+@cache.cached(lambda: ['catalog'])
 def get_all_services():
     category = request.args.get('category')
 
-    query = Service.query.filter_by(is_active=True)
+    query = projections.CATALOG_SERVICE.query().filter(Service.is_active.is_(True))
 
     if category:
-        query = query.filter_by(category=category)
+        query = query.filter(Service.category == category)
 
-    services = query.all()
+    services, next_cursor = keyset_page(query, [Service.id])
 
-    results = []
-    for service in services:
-        service_data = service.serialize()
-        service_data['provider'] = {
-            'id': service.provider.id,
-            'name': service.provider.name,
-            'businessName': service.provider.business_name,
-            'phone': service.provider.phone,
-            'email': service.provider.user.email,
-            'city': service.provider.city,
-            'state': service.provider.state,
-            'rating': service.provider.rating
-        }
-        results.append(service_data)
-
-    return jsonify(results), 200
+    return jsonify(page_response(
+        projections.CATALOG_SERVICE.dicts(services), next_cursor)), 200
 
 
 @api.route('/providers/<int:provider_id>', methods=['GET'])
+@cache.cached(lambda provider_id: [f'provider:{provider_id}'])
 def get_provider_details(provider_id):
-    provider = Provider.query.get(provider_id)
+    provider = db.session.get(
+        Provider, provider_id, options=LOAD_PROFILES['provider'])
 
     if not provider:
         return jsonify({'message': 'Provider not found'}), 404
@@ -467,17 +463,36 @@ def get_provider_details(provider_id):
     return jsonify(provider.serialize()), 200
 
 
+def provider_services_summary(provider_id):
+    """As catalog_summary, for one provider's services."""
+    summary = tuple(db.session.query(
+        func.count(Service.id),
+        func.max(Service.id),
+        func.max(Service.updated_at)
+    ).filter(
+        Service.provider_id == provider_id,
+        Service.is_active.is_(True)
+    ).one())
+    return summary, None
+
+
 @api.route('/providers/<int:provider_id>/services', methods=['GET'])
+@cache.conditional(cache.scope_validator(
+    lambda provider_id: [f'provider:{provider_id}'], provider_services_summary))
+@cache.cached(lambda provider_id: [f'provider:{provider_id}'])
 def get_provider_services_public(provider_id):
     provider = Provider.query.get(provider_id)
 
     if not provider:
         return jsonify({'message': 'Provider not found'}), 404
 
-    services = Service.query.filter_by(
-        provider_id=provider_id, is_active=True).all()
+    services, next_cursor = keyset_page(
+        projections.SERVICE.query().filter(
+            Service.provider_id == provider_id, Service.is_active.is_(True)),
+        [Service.id])
 
-    return jsonify([service.serialize() for service in services]), 200
+    return jsonify(page_response(
+        projections.SERVICE.dicts(services), next_cursor)), 200
 
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -493,6 +508,29 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return c * r
 
 
+def bounding_box(lat, lon, radius):
+    """
+    Return (min_lat, max_lat, min_lon, max_lon) enclosing a circle of
+    `radius` miles around (lat, lon). Used as an index-friendly prefilter;
+    callers still apply haversine_distance to the candidates.
+    """
+    lat_delta = radius / 69.0
+    min_lat = max(lat - lat_delta, -90.0)
+    max_lat = min(lat + lat_delta, 90.0)
+
+    # Longitude degrees shrink towards the poles; near them (or when the box
+    # would wrap the antimeridian) just take the full longitude range.
+    cos_lat = cos(radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat < 1e-6:
+        return min_lat, max_lat, -180.0, 180.0
+
+    lon_delta = radius / (69.0 * cos_lat)
+    if lon - lon_delta < -180.0 or lon + lon_delta > 180.0:
+        return min_lat, max_lat, -180.0, 180.0
+
+    return min_lat, max_lat, lon - lon_delta, lon + lon_delta
+
+
 @api.route('/services/nearby', methods=['GET'])
 def get_nearby_services():
 
@@ -502,29 +540,66 @@ def get_nearby_services():
     except (TypeError, ValueError):
         return jsonify({'message': 'Valid latitude and longitude required'}), 400
 
-    radius = float(request.args.get('radius', 25))
+    try:
+        radius = float(request.args.get('radius', 25))
+    except ValueError:
+        radius = float('nan')
+    if not isfinite(radius) or radius <= 0:
+        return jsonify({'message': 'radius must be a positive number of miles'}), 400
+
     category = request.args.get('category')
+    # Everything within the radius unless the client asks for the closest `limit`
+    limit = page_limit()
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+
+    if proximity.is_enabled():
+        # The closest `limit` services belong to at most `limit` providers
+        matches = proximity.get_index().nearest(
+            user_lat, user_lon, radius, category, limit=limit)
+        distances = dict(matches)
+
+        services = Service.query.filter(
+            Service.is_active.is_(True),
+            Service.provider_id.in_(distances)
+        ).options(
+            *LOAD_PROFILES['catalog']
+        )
+        if category:
+            services = services.filter(Service.category == category)
 
-    query = Service.query.filter_by(is_active=True)
+        candidates = [(s, distances[s.provider_id]) for s in services]
+    else:
+        min_lat, max_lat, min_lon, max_lon = bounding_box(
+            user_lat, user_lon, radius)
+
+        # Only providers inside the radius box come back from the database
+        # (served by ix_providers_lat_lon); exact distance is checked below.
+        query = Service.query.join(Service.provider).filter(
+            Service.is_active.is_(True),
+            Provider.latitude.between(min_lat, max_lat),
+            Provider.longitude.between(min_lon, max_lon)
+        ).options(
+            contains_eager(Service.provider).joinedload(Provider.user)
+        )
 
-    if category:
-        query = query.filter_by(category=category)
+        if category:
+            query = query.filter(Service.category == category)
 
-    services = query.all()
+        candidates = []
+        for service in query.all():
+            distance = haversine_distance(
+                user_lat, user_lon,
+                service.provider.latitude, service.provider.longitude
+            )
+            if distance <= radius:
+                candidates.append((service, distance))
 
     nearby_services = []
-    for service in services:
-        provider = service.provider
-
-        if not provider.latitude or not provider.longitude:
-            continue
-
-        distance = haversine_distance(
-            user_lat, user_lon,
-            provider.latitude, provider.longitude
-        )
+    with projections.serializing(len(candidates)):
+        for service, distance in candidates:
+            provider = service.provider
 
-        if distance <= radius:
             service_data = service.serialize()
             service_data['provider'] = {
                 'id': provider.id,
@@ -540,23 +615,94 @@ def get_nearby_services():
             nearby_services.append(service_data)
 
     nearby_services.sort(key=lambda x: x['provider']['distance'])
+    if limit is not None:
+        del nearby_services[limit:]
 
     return jsonify(nearby_services), 200
 
 
+@api.route('/services/search', methods=['GET'])
+def search_services():
+    q = (request.args.get('q') or '').strip()
+    if not q:
+        return jsonify({'message': 'Search query q is required'}), 400
+
+    if not search.available():
+        return jsonify({'message': 'Search is not available'}), 503
+
+    hits = search.matches(q)
+    if hits is None:
+        return jsonify(page_response([], None)), 200
+
+    query = db.session.query(Service, hits.c.score, hits.c.service_id).join(
+        hits, hits.c.service_id == Service.id
+    ).join(Service.provider).filter(
+        Service.is_active.is_(True)
+    ).options(
+        contains_eager(Service.provider).joinedload(Provider.user)
+    )
+
+    category = request.args.get('category')
+    if category:
+        query = query.filter(Service.category == category)
+
+    origin = None
+    if request.args.get('lat') is not None or request.args.get('lon') is not None:
+        try:
+            origin = (float(request.args.get('lat')), float(request.args.get('lon')))
+            radius = float(request.args.get('radius', 25))
+        except (TypeError, ValueError):
+            return jsonify({'message': 'Valid latitude, longitude and radius required'}), 400
+
+        min_lat, max_lat, min_lon, max_lon = bounding_box(*origin, radius)
+        query = query.filter(
+            Provider.latitude.between(min_lat, max_lat),
+            Provider.longitude.between(min_lon, max_lon)
+        )
+
+    # Best match first; the cursor carries (score, id) of the last row read,
+    # so pages stay stable even when the exact radius check drops some rows.
+    rows, next_cursor = keyset_page(
+        query, [hits.c.score, hits.c.service_id], descending=True)
+
+    results = []
+    with projections.serializing(len(rows)):
+        for service, score, _ in rows:
+            provider = service.provider
+
+            service_data = service.serialize()
+            service_data['score'] = score
+            service_data['provider'] = {
+                'id': provider.id,
+                'name': provider.name,
+                'businessName': provider.business_name,
+                'phone': provider.phone,
+                'email': provider.user.email,
+                'city': provider.city,
+                'state': provider.state,
+                'rating': provider.rating
+            }
+
+            if origin is not None:
+                distance = haversine_distance(
+                    *origin, provider.latitude, provider.longitude)
+                if distance > radius:
+                    continue
+                service_data['provider']['distance'] = round(distance, 1)
+
+            results.append(service_data)
+
+    return jsonify(page_response(results, next_cursor)), 200
+
+
 @api.route('/bookings', methods=['POST'])
 @jwt_required()
 @customer_required()
 def create_booking():
     """
-    Create a new booking and send SMS notifications via Twilio
+    Create a new booking and queue SMS notifications for both parties
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
+    customer = current_profile()
 
     data = request.get_json() or {}
 
@@ -581,43 +727,36 @@ def create_booking():
         total_price=service.price
     )
 
-    db.session.add(new_booking)
-    db.session.flush()
-
     try:
+        db.session.add(new_booking)
+        db.session.flush()
+
+        # Notifications are written to the outbox in the same transaction and
+        # delivered by `flask sms-worker`, so the gateway is never on the
+        # request path.
+        sms_queued = 0
         if customer.phone:
-            sms_service.send_booking_confirmation_to_customer(
-                customer.phone,
+            enqueue_sms(customer.phone, SMSService.booking_confirmation_message(
                 provider.name,
                 provider.phone or 'Not provided',
                 provider.user.email
-            )
+            ), booking_id=new_booking.id)
+            sms_queued += 1
 
         if provider.phone:
-            sms_service.send_booking_notification_to_provider(
-                provider.phone,
+            enqueue_sms(provider.phone, SMSService.booking_notification_message(
                 customer.name,
                 customer.address or 'Not provided',
                 service.name
-            )
-
-        db.session.commit()
-
-        return jsonify({
-            'message': 'Booking created successfully and SMS notifications sent',
-            'booking': new_booking.serialize()
-        }), 201
+            ), booking_id=new_booking.id)
+            sms_queued += 1
 
-    except ValueError as e:
-        db.session.rollback()
-        print(f"SMS Error: {str(e)}")
-        db.session.add(new_booking)
         db.session.commit()
 
         return jsonify({
-            'message': 'Booking created but SMS notification failed',
+            'message': 'Booking created successfully',
             'booking': new_booking.serialize(),
-            'sms_error': str(e)
+            'smsQueued': sms_queued
         }), 201
 
     except Exception as e:
@@ -631,7 +770,9 @@ def get_recent_bookings():
     user_id = get_jwt_identity()
     category = request.args.get('category', None)
 
-    query = Booking.query.filter_by(customer_id=user_id)
+    query = Booking.query.options(
+        *LOAD_PROFILES['recent_bookings']
+    ).filter_by(customer_id=user_id)
 
     if category:
         query = query.join(Service).filter(Service.category == category)
@@ -662,12 +803,7 @@ def customer_profile():
     """
     Get or update customer profile information (fullName, phone, address)
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
+    customer = current_profile()
 
     if request.method == 'GET':
         return jsonify({
@@ -704,17 +840,11 @@ def send_message():
     """
     Send a message from customer to provider
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
+    customer_id = g.current_profile_id
 
     data = request.get_json() or {}
     provider_id = data.get('provider_id')
     message_text = data.get('message')
-    service_id = data.get('service_id')
 
     if not provider_id or not message_text:
         return jsonify({'message': 'provider_id and message are required'}), 400
@@ -725,9 +855,9 @@ def send_message():
 
     # Create the message
     message = Message(
-        customer_id=customer.id,
+        customer_id=customer_id,
         provider_id=provider_id,
-        sender_id=user_id,
+        sender_id=g.current_user_id,
         sender_type='customer',
         message=message_text,
         is_read=False
@@ -735,6 +865,7 @@ def send_message():
 
     db.session.add(message)
     db.session.commit()
+    message_hub.notify(message.customer_id, message.provider_id)
 
     return jsonify({
         'message': 'Message sent successfully',
@@ -742,34 +873,68 @@ def send_message():
     }), 201
 
 
-@api.route("/messages/<int:provider_id>", methods=["GET"])
-@jwt_required()
-@customer_required()
-def get_messages(provider_id):
+def mark_read(sender_type, *criteria):
     """
-    Get all messages between current customer and a specific provider
+    Mark unread messages from `sender_type` matching `criteria` as read
+    with a single UPDATE, however long the conversation is.
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
+    return Message.query.filter(
+        *criteria,
+        Message.sender_type == sender_type,
+        Message.is_read.is_(False)
+    ).update({'is_read': True}, synchronize_session=False)
 
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
 
-    # Fetch all messages between this customer and provider
-    messages = Message.query.filter(
-        ((Message.customer_id == customer.id) &
-         (Message.provider_id == provider_id))
-    ).order_by(Message.created_at.asc()).all()
+def conversation_response(customer_id, provider_id, incoming):
+    """
+    Messages of one conversation, marking `incoming` ones as read.
+
+    ?after_id=<id> returns only newer messages. Adding ?wait=<seconds>
+    long-polls: if nothing newer exists yet the request is parked (at most
+    MAX_WAIT_SECONDS) until a message arrives in this conversation.
+    """
+    after_id = request.args.get('after_id', type=int)
+    wait = request.args.get('wait', 0, type=float)
+    if not isfinite(wait):
+        return jsonify({'message': 'wait must be a finite number of seconds'}), 400
+    wait = max(0.0, min(wait, message_hub.MAX_WAIT_SECONDS))
+
+    criteria = (Message.customer_id == customer_id,
+                Message.provider_id == provider_id)
+
+    def fetch():
+        mark_read(incoming, *criteria)
+
+        query = Message.query.options(*LOAD_PROFILES['messages']).filter(*criteria)
+        if after_id is not None:
+            query = query.filter(Message.id > after_id)
+        messages = query.order_by(Message.created_at.asc(), Message.id.asc()).all()
+
+        # Serialize before committing; the commit expires every loaded row.
+        # Committing also returns the connection to the pool before a wait.
+        results = projections.serialize_all(messages)
+        db.session.commit()
+        return results
 
-    # Mark messages as read if they were sent to this customer
-    for msg in messages:
-        if msg.sender_type == 'provider':
-            msg.is_read = True
+    if after_id is None or wait <= 0:
+        return jsonify(fetch()), 200
 
-    db.session.commit()
+    with message_hub.subscribe(customer_id, provider_id) as wait_for_message:
+        results = fetch()
+        if not results and wait_for_message(wait):
+            results = fetch()
 
-    return jsonify([msg.serialize() for msg in messages]), 200
+    return jsonify(results), 200
+
+
+@api.route("/messages/<int:provider_id>", methods=["GET"])
+@jwt_required()
+@customer_required()
+def get_messages(provider_id):
+    """
+    Get all messages between current customer and a specific provider
+    """
+    return conversation_response(g.current_profile_id, provider_id, 'provider')
 
 
 @api.route("/messages/provider/<int:customer_id>", methods=["GET"])
@@ -779,27 +944,7 @@ def get_provider_messages(customer_id):
     """
     Get all messages between current provider and a specific customer
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    provider = Provider.query.filter_by(user_id=user_id).first()
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
-
-    # Fetch all messages between this customer and provider
-    messages = Message.query.filter(
-        ((Message.customer_id == customer_id) &
-         (Message.provider_id == provider.id))
-    ).order_by(Message.created_at.asc()).all()
-
-    # Mark messages as read if they were sent to this provider
-    for msg in messages:
-        if msg.sender_type == 'customer':
-            msg.is_read = True
-
-    db.session.commit()
-
-    return jsonify([msg.serialize() for msg in messages]), 200
+    return conversation_response(customer_id, g.current_profile_id, 'customer')
 
 
 @api.route("/provider/messages", methods=["GET"])
@@ -809,24 +954,71 @@ def get_provider_all_messages():
     """
     Get all messages received by the provider
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
+    provider_id = g.current_profile_id
 
-    provider = Provider.query.filter_by(user_id=user_id).first()
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    # Mark customer messages as read
+    mark_read('customer', Message.provider_id == provider_id)
 
     # Fetch all messages for this provider
-    messages = Message.query.filter_by(provider_id=provider.id).all()
-
-    # Mark customer messages as read
-    for msg in messages:
-        if msg.sender_type == 'customer' and not msg.is_read:
-            msg.is_read = True
+    messages = Message.query.options(
+        *LOAD_PROFILES['messages']
+    ).filter_by(provider_id=provider_id).all()
 
+    # Serialize before committing; the commit expires every loaded row.
+    results = projections.serialize_all(messages)
     db.session.commit()
 
-    return jsonify([msg.serialize() for msg in messages]), 200
+    return jsonify(results), 200
+
+
+@api.route("/conversations", methods=["GET"])
+@jwt_required()
+@profile_required()
+def get_conversations():
+    """
+    Inbox for the current customer or provider: one row per counterpart
+    with the last message and the number of unread messages, newest first
+    """
+    if g.current_role == 'provider':
+        own_column, other_column = Message.provider_id, Message.customer_id
+        incoming = 'customer'
+        other_model, other_name = Customer, Customer.name
+    else:
+        own_column, other_column = Message.customer_id, Message.provider_id
+        incoming = 'provider'
+        other_model = Provider
+        other_name = func.coalesce(Provider.business_name, Provider.name)
+
+    summary = db.session.query(
+        other_column.label('other_id'),
+        func.max(Message.id).label('last_id'),
+        func.sum(case(
+            ((Message.sender_type == incoming) & (Message.is_read.is_(False)), 1),
+            else_=0
+        )).label('unread')
+    ).filter(own_column == g.current_profile_id).group_by(other_column).subquery()
+
+    rows = db.session.query(
+        summary.c.other_id,
+        other_name,
+        Message.message,
+        Message.sender_type,
+        Message.created_at,
+        summary.c.unread
+    ).select_from(summary).join(
+        Message, Message.id == summary.c.last_id
+    ).join(
+        other_model, other_model.id == summary.c.other_id
+    ).order_by(Message.created_at.desc(), Message.id.desc()).all()
+
+    return jsonify([{
+        'counterpartId': other_id,
+        'counterpartName': name,
+        'lastMessage': text[:120],
+        'lastSenderType': sender_type,
+        'lastMessageAt': created_at.isoformat(),
+        'unreadCount': int(unread or 0)
+    } for other_id, name, text, sender_type, created_at, unread in rows]), 200
 
 
 @api.route("/messages/provider/send", methods=["POST"])
@@ -836,12 +1028,7 @@ def send_provider_message():
     """
     Send a message from provider to customer
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    provider = Provider.query.filter_by(user_id=user_id).first()
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    provider_id = g.current_profile_id
 
     data = request.get_json() or {}
     customer_id = data.get('customer_id')
@@ -857,8 +1044,8 @@ def send_provider_message():
     # Create the message
     message = Message(
         customer_id=customer_id,
-        provider_id=provider.id,
-        sender_id=user_id,
+        provider_id=provider_id,
+        sender_id=g.current_user_id,
         sender_type='provider',
         message=message_text,
         is_read=False
@@ -866,6 +1053,7 @@ def send_provider_message():
 
     db.session.add(message)
     db.session.commit()
+    message_hub.notify(message.customer_id, message.provider_id)
 
     return jsonify({
         'message': 'Message sent successfully',
@@ -908,6 +1096,32 @@ def delete_message(message_id):
     return jsonify({'message': 'Message deleted successfully'}), 200
 
 
+DELETE_CHUNK_SIZE = 1000
+
+
+def delete_in_chunks(model, *criteria):
+    """
+    Delete rows matching `criteria` with bulk DELETE statements of at most
+    DELETE_CHUNK_SIZE rows each, all in one transaction: a failure part way
+    rolls back every chunk rather than leaving a half-deleted conversation.
+    Returns the number deleted.
+    """
+    deleted = 0
+    while True:
+        ids = [row_id for (row_id,) in db.session.query(model.id).filter(
+            *criteria).limit(DELETE_CHUNK_SIZE)]
+        if not ids:
+            break
+
+        deleted += model.query.filter(model.id.in_(ids)).delete(
+            synchronize_session=False)
+
+        if len(ids) < DELETE_CHUNK_SIZE:
+            break
+    db.session.commit()
+    return deleted
+
+
 @api.route("/conversations/<int:provider_id>", methods=["DELETE"])
 @jwt_required()
 @customer_required()
@@ -915,28 +1129,19 @@ def delete_conversation(provider_id):
     """
     Delete entire conversation between customer and provider
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    customer = Customer.query.filter_by(user_id=user_id).first()
-    if not customer:
-        return jsonify({'message': 'Customer profile not found'}), 404
+    customer_id = g.current_profile_id
 
     # Delete all messages between this customer and provider
-    messages = Message.query.filter(
-        (Message.customer_id == customer.id) &
-        (Message.provider_id == provider_id)
-    ).all()
+    deleted = delete_in_chunks(
+        Message,
+        Message.customer_id == customer_id,
+        Message.provider_id == provider_id
+    )
 
-    if not messages:
+    if not deleted:
         return jsonify({'message': 'No conversation found'}), 404
 
-    for msg in messages:
-        db.session.delete(msg)
-
-    db.session.commit()
-
-    return jsonify({'message': 'Conversation deleted successfully'}), 200
+    return jsonify({'message': 'Conversation deleted successfully', 'deleted': deleted}), 200
 
 
 @api.route("/provider/conversations/<int:customer_id>", methods=["DELETE"])
@@ -946,25 +1151,16 @@ def delete_provider_conversation(customer_id):
     """
     Delete entire conversation between provider and customer
     """
-    user_id_str = get_jwt_identity()
-    user_id = int(user_id_str)
-
-    provider = Provider.query.filter_by(user_id=user_id).first()
-    if not provider:
-        return jsonify({'message': 'Provider profile not found'}), 404
+    provider_id = g.current_profile_id
 
     # Delete all messages between this provider and customer
-    messages = Message.query.filter(
-        (Message.customer_id == customer_id) &
-        (Message.provider_id == provider.id)
-    ).all()
+    deleted = delete_in_chunks(
+        Message,
+        Message.customer_id == customer_id,
+        Message.provider_id == provider_id
+    )
 
-    if not messages:
+    if not deleted:
         return jsonify({'message': 'No conversation found'}), 404
 
-    for msg in messages:
-        db.session.delete(msg)
-
-    db.session.commit()
-
-    return jsonify({'message': 'Conversation deleted successfully'}), 200
+    return jsonify({'message': 'Conversation deleted successfully', 'deleted': deleted}), 200
@@ -0,0 +1,166 @@
+"""
+Full-text search over services.
+
+Each service has one row in `service_search` built from the service name,
+the provider's business name and the service description (weighted in
+that order):
+
+    Postgres  service_search(service_id, document tsvector) with a GIN
+              index, queried with websearch_to_tsquery and ranked by ts_rank
+    SQLite    FTS5 virtual table keyed by rowid = service id, ranked by bm25
+
+The table is created by migration (or `flask search-rebuild` on databases
+made with create_all). Whether it exists is re-checked every
+SEARCH_AVAILABLE_TTL seconds (default 60), so a migration that adds it
+takes effect without a restart. Routes keep it in sync inside their own
+transaction through index_service / remove_service / index_provider.
+"""
+import os
+import re
+import time
+from sqlalchemy import Float, Integer, cast, func, literal_column, select, table, column, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from api.models import db
+
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', coalesce(s.name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(p.business_name, p.name, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(s.description, '')), 'C')
+"""
+
+POSTGRES_DDL = [
+    """CREATE TABLE IF NOT EXISTS service_search (
+        service_id INTEGER PRIMARY KEY REFERENCES services(id) ON DELETE CASCADE,
+        document TSVECTOR NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_service_search_document ON service_search USING GIN (document)",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS service_search USING fts5(
+        name, business_name, description, tokenize = 'porter unicode61'
+    )""",
+]
+
+AVAILABLE_TTL = float(os.environ.get('SEARCH_AVAILABLE_TTL', 60))
+
+# engine url -> (table exists, monotonic time checked)
+_available = {}
+
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+
+def available():
+    """True when the search table exists on this database (cached for AVAILABLE_TTL)."""
+    engine = db.session.get_bind()
+    cached = _available.get(engine.url)
+    if cached is None or time.monotonic() - cached[1] >= AVAILABLE_TTL:
+        cached = _available[engine.url] = (
+            engine.dialect.name in ('postgresql', 'sqlite')
+            and db.inspect(engine).has_table('service_search'),
+            time.monotonic())
+    return cached[0]
+
+
+def _reindex(where, params):
+    """(Re)build the rows for services matching `where` (SQL on s / p)."""
+    if not available():
+        return
+
+    if _dialect() == 'postgresql':
+        db.session.execute(text(f"""
+            INSERT INTO service_search (service_id, document)
+            SELECT s.id, {POSTGRES_DOCUMENT}
+            FROM services s JOIN providers p ON p.id = s.provider_id
+            WHERE {where}
+            ON CONFLICT (service_id) DO UPDATE SET document = EXCLUDED.document
+        """), params)
+    else:
+        db.session.execute(text(f"""
+            DELETE FROM service_search WHERE rowid IN (
+                SELECT s.id FROM services s JOIN providers p ON p.id = s.provider_id
+                WHERE {where})
+        """), params)
+        db.session.execute(text(f"""
+            INSERT INTO service_search (rowid, name, business_name, description)
+            SELECT s.id, s.name, coalesce(p.business_name, p.name, ''),
+                   coalesce(s.description, '')
+            FROM services s JOIN providers p ON p.id = s.provider_id
+            WHERE {where}
+        """), params)
+
+
+def index_service(service):
+    db.session.flush()
+    _reindex("s.id = :service_id", {'service_id': service.id})
+
+
+def index_provider(provider_id):
+    """Refresh every service of a provider, e.g. after a rename."""
+    db.session.flush()
+    _reindex("s.provider_id = :provider_id", {'provider_id': provider_id})
+
+
+def remove_service(service_id):
+    # Postgres removes the row through ON DELETE CASCADE
+    if available() and _dialect() == 'sqlite':
+        db.session.execute(
+            text("DELETE FROM service_search WHERE rowid = :service_id"),
+            {'service_id': service_id})
+
+
+def rebuild():
+    """Create the search table if needed and index every service."""
+    ddl = POSTGRES_DDL if _dialect() == 'postgresql' else SQLITE_DDL
+    for statement in ddl:
+        db.session.execute(text(statement))
+    _available.clear()
+
+    if _dialect() == 'sqlite':
+        db.session.execute(text("DELETE FROM service_search"))
+    _reindex("1 = 1", {})
+    db.session.commit()
+
+
+def _fts5_query(q):
+    # Quote each word so user input can't inject FTS5 syntax; the trailing *
+    # makes the last word a prefix match for search-as-you-type.
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def matches(q):
+    """
+    Subquery of (service_id, score) for services matching `q`, higher
+    score = more relevant. Returns None if `q` has nothing searchable.
+    """
+    if _dialect() == 'postgresql':
+        search = table('service_search',
+                       column('service_id', Integer),
+                       column('document', TSVECTOR))
+        tsquery = func.websearch_to_tsquery('english', q)
+        return select(
+            search.c.service_id.label('service_id'),
+            # ts_rank is real (float4); the keyset cursor carries a double, and
+            # comparing that to a float4 would repeat the page's last rows
+            cast(func.ts_rank(search.c.document, tsquery), Float(precision=53)).label('score')
+        ).where(search.c.document.op('@@')(tsquery)).subquery()
+
+    fts_query = _fts5_query(q)
+    if fts_query is None:
+        return None
+
+    search = table('service_search', column('rowid', Integer))
+    # bm25 is lower-is-better; weights follow the column order name,
+    # business_name, description
+    bm25 = func.bm25(literal_column('service_search'), 10.0, 5.0, 1.0, type_=Float)
+    return select(
+        search.c.rowid.label('service_id'),
+        (-bm25).label('score')
+    ).where(literal_column('service_search').op('MATCH')(fts_query)).subquery()
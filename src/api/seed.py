@@ -0,0 +1,313 @@
+"""
+Deterministic synthetic data for load testing.
+
+generate() writes providers spread over a few metro areas, their services,
+customers, bookings over a date range and message threads. The same seed
+and `today` produce the same rows. Ids are assigned here, starting after
+the current maximum of each table, so rows go in with plain bulk inserts:
+
+    Postgres  COPY ... FROM STDIN (sequences are moved past the new ids)
+    others    executemany in chunks of CHUNK_SIZE
+
+Derived data (earnings rollup, search index) is rebuilt at the end.
+
+    $ flask seed --providers 2000 --customers 20000 --bookings 500000
+"""
+import io
+import random
+from functools import lru_cache
+from datetime import datetime, timedelta, time
+from sqlalchemy import func
+from api.models import db, User, Provider, Customer, Service, Booking, Message
+from api import cache, earnings, search
+
+CHUNK_SIZE = 10000
+PASSWORD = "123456"
+
+# name, state, latitude, longitude, spread in degrees
+METRO_AREAS = [
+    ("Miami", "FL", 25.76, -80.19, 0.35),
+    ("Orlando", "FL", 28.54, -81.38, 0.30),
+    ("Tampa", "FL", 27.95, -82.46, 0.30),
+    ("Atlanta", "GA", 33.75, -84.39, 0.40),
+    ("Houston", "TX", 29.76, -95.37, 0.45),
+    ("Chicago", "IL", 41.88, -87.63, 0.35),
+    ("New York", "NY", 40.71, -74.01, 0.30),
+    ("Los Angeles", "CA", 34.05, -118.24, 0.50),
+]
+
+# category -> (name, description, base price, duration in minutes)
+SERVICE_TEMPLATES = {
+    "pets": [
+        ("Dog walking", "Neighborhood walks for dogs of every size", 25, 30),
+        ("Pet grooming", "Bath, brush, nail trim and ear cleaning", 60, 90),
+        ("Pet sitting", "In-home visits while you are away", 40, 60),
+        ("Obedience training", "Basic commands and leash manners", 80, 60),
+    ],
+    "beauty": [
+        ("Haircut", "Cut and style at your home", 45, 45),
+        ("Manicure", "Classic or gel manicure", 35, 45),
+        ("Makeup", "Event and bridal makeup", 90, 60),
+        ("Massage", "Relaxing full body massage", 100, 60),
+    ],
+    "vehicles": [
+        ("Car detailing", "Interior and exterior detailing", 150, 180),
+        ("Mobile car wash", "Hand wash and wax in your driveway", 50, 60),
+        ("Oil change", "Synthetic oil change at your location", 70, 45),
+        ("Tire rotation", "Rotate and balance all four tires", 60, 45),
+    ],
+    "home": [
+        ("House cleaning", "Standard cleaning of kitchen, baths and floors", 120, 180),
+        ("Handyman", "Small repairs, mounting and assembly", 75, 60),
+        ("Lawn care", "Mowing, edging and blowing", 55, 60),
+        ("Plumbing repair", "Leaks, clogs and fixture installs", 110, 90),
+    ],
+}
+
+FIRST_NAMES = ["Ana", "Luis", "Maria", "James", "Sofia", "David", "Emma", "Carlos",
+               "Olivia", "Miguel", "Ava", "Daniel", "Isabella", "Jose", "Mia", "Noah"]
+LAST_NAMES = ["Garcia", "Smith", "Rodriguez", "Johnson", "Martinez", "Brown",
+              "Lopez", "Davis", "Gonzalez", "Wilson", "Perez", "Moore"]
+BUSINESS_SUFFIXES = ["Services", "Pros", "Co.", "Express", "& Sons", "Mobile"]
+MESSAGE_LINES = [
+    "Hi, are you available this week?",
+    "Yes, I have openings on Thursday and Friday.",
+    "Great, what time works for you?",
+    "Morning works best, around 10am.",
+    "Perfect, see you then.",
+    "Running about 10 minutes late, sorry!",
+    "No problem, thanks for letting me know.",
+    "Thanks again, great job!",
+]
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _chunks(rows):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def bulk_insert(model, columns, rows, defer_indexes=False):
+    """
+    Insert an iterable of tuples (in `columns` order); returns the row count.
+    With defer_indexes the table's secondary indexes are dropped for the
+    load and rebuilt once at the end, instead of being updated per row.
+    """
+    table = model.__table__
+    conn = db.session.connection()
+
+    if defer_indexes:
+        for index in table.indexes:
+            index.drop(conn)
+        try:
+            return bulk_insert(model, columns, rows)
+        finally:
+            for index in table.indexes:
+                index.create(conn)
+
+    count = 0
+
+    if conn.dialect.name == "postgresql":
+        name = conn.dialect.identifier_preparer.format_table(table)
+        cursor = conn.connection.dbapi_connection.cursor()
+        for chunk in _chunks(rows):
+            buffer = io.StringIO()
+            for row in chunk:
+                buffer.write("\t".join(_copy_value(v) for v in row))
+                buffer.write("\n")
+            buffer.seek(0)
+            cursor.copy_expert(f"COPY {name} ({', '.join(columns)}) FROM STDIN", buffer)
+            count += len(chunk)
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"(SELECT max(id) FROM {name}))")
+        return count
+
+    # Positional executemany straight to the driver, with each column's bind
+    # processor (e.g. SQLite date/time to text) applied up front: SQLAlchemy's
+    # per-row parameter handling costs more than the insert itself.
+    placeholder = {"qmark": "?", "format": "%s"}.get(conn.dialect.paramstyle)
+    if placeholder is None:
+        for chunk in _chunks(rows):
+            conn.execute(table.insert(), [dict(zip(columns, row)) for row in chunk])
+            count += len(chunk)
+        return count
+
+    # Memoized: seeded dates and times repeat across many rows
+    processors = [
+        (i, lru_cache(maxsize=4096)(processor)) for i, processor in (
+            (i, table.c[name].type.dialect_impl(conn.dialect).bind_processor(conn.dialect))
+            for i, name in enumerate(columns))
+        if processor is not None
+    ]
+    name = conn.dialect.identifier_preparer.format_table(table)
+    statement = (f"INSERT INTO {name} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join([placeholder] * len(columns))})")
+    for chunk in _chunks(rows):
+        if processors:
+            processed = []
+            for row in chunk:
+                row = list(row)
+                for i, processor in processors:
+                    row[i] = processor(row[i])
+                processed.append(tuple(row))
+            chunk = processed
+        conn.exec_driver_sql(statement, chunk)
+        count += len(chunk)
+    return count
+
+
+def generate(providers=100, customers=500, services_per_provider=4,
+             bookings=5000, threads=1000, messages_per_thread=8,
+             days=365, seed=42, today=None):
+    """
+    Add a synthetic dataset and commit. Returns {table name: rows added}.
+    Bookings fall between `days` before `today` and 30 days after it.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.utcnow().date()
+    now = datetime.combine(today, time(12, 0))
+    categories = list(SERVICE_TEMPLATES)
+    counts = {}
+
+    def person():
+        return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+    def phone():
+        return f"+1305{rng.randrange(10 ** 7):07d}"
+
+    # Users first: one per provider and customer
+    user_id = _next_id(User)
+    provider_users = list(range(user_id, user_id + providers))
+    customer_users = list(range(user_id + providers, user_id + providers + customers))
+    names = [person() for _ in range(providers + customers)]
+    counts["user"] = bulk_insert(User, ("id", "full_name", "email", "password", "role", "is_active", "updated_at"), (
+        (uid, names[i], f"seed-{'provider' if i < providers else 'customer'}-{uid}@seed.test",
+         PASSWORD, "provider" if i < providers else "customer", True, now)
+        for i, uid in enumerate(provider_users + customer_users)
+    ))
+
+    provider_id = _next_id(Provider)
+    provider_ids = list(range(provider_id, provider_id + providers))
+    provider_rows = []
+    for i, pid in enumerate(provider_ids):
+        metro, state, lat, lon, spread = rng.choice(METRO_AREAS)
+        category = rng.choice(categories)
+        last_name = names[i].split()[-1]
+        provider_rows.append((
+            pid, provider_users[i], names[i],
+            f"{last_name} {category.title()} {rng.choice(BUSINESS_SUFFIXES)}",
+            phone(), f"{category.title()} services around {metro}",
+            f"{rng.randrange(100, 9999)} {rng.choice(LAST_NAMES)} St", metro, state,
+            f"{rng.randrange(10000, 99999)}",
+            round(lat + rng.gauss(0, spread / 2), 6), round(lon + rng.gauss(0, spread / 2), 6),
+            round(rng.uniform(3.0, 5.0), 1), rng.randrange(0, 300), rng.random() < 0.7,
+            now, now, category
+        ))
+    counts["providers"] = bulk_insert(Provider, (
+        "id", "user_id", "name", "business_name", "phone", "description", "address",
+        "city", "state", "zip_code", "latitude", "longitude", "rating",
+        "total_reviews", "is_verified", "created_at", "updated_at"
+    ), (row[:-1] for row in provider_rows))
+
+    customer_id = _next_id(Customer)
+    customer_ids = list(range(customer_id, customer_id + customers))
+    counts["customers"] = bulk_insert(Customer, (
+        "id", "user_id", "name", "phone", "address", "created_at"
+    ), (
+        (cid, customer_users[i], names[providers + i], phone(),
+         f"{rng.randrange(100, 9999)} {rng.choice(LAST_NAMES)} Ave", now)
+        for i, cid in enumerate(customer_ids)
+    ))
+
+    # Services mostly in the provider's own category
+    service_id = _next_id(Service)
+    services = []  # (id, provider index, price)
+    service_rows = []
+    for index, provider in enumerate(provider_rows):
+        for _ in range(services_per_provider):
+            category = provider[-1] if rng.random() < 0.8 else rng.choice(categories)
+            name, description, price, duration = rng.choice(SERVICE_TEMPLATES[category])
+            price = round(price * rng.uniform(0.8, 1.3), 2)
+            services.append((service_id, index, price))
+            service_rows.append((
+                service_id, provider[0], name, description, category, price,
+                duration, rng.random() < 0.95, now, now
+            ))
+            service_id += 1
+    counts["services"] = bulk_insert(Service, (
+        "id", "provider_id", "name", "description", "category", "price",
+        "duration", "is_active", "created_at", "updated_at"
+    ), service_rows)
+
+    # Bookings dominate large datasets, so this loop draws indexes from
+    # rng.random() into precomputed dates, slots and lead times.
+    dates = [today + timedelta(days=d) for d in range(-days, 31)]
+    mornings = [datetime.combine(day, time(9)) for day in dates]
+    slots = [time(hour, minute) for hour in range(8, 19) for minute in (0, 30)]
+    lead_times = [timedelta(days=d) for d in range(1, 15)]
+
+    def booking_rows():
+        r = rng.random
+        first_id = _next_id(Booking)
+        count = bookings if services and customer_ids else 0
+        for booking_id in range(first_id, first_id + count):
+            sid, index, price = services[int(r() * len(services))]
+            d = int(r() * len(dates))
+            if d < days:
+                status = "cancelled" if r() < 0.1 else "completed"
+            else:
+                status = "pending" if r() < 0.5 else "confirmed"
+            created = mornings[d] - lead_times[int(r() * len(lead_times))]
+            yield (booking_id, customer_ids[int(r() * customers)], provider_ids[index],
+                   sid, dates[d], slots[int(r() * len(slots))], status, price,
+                   None, created, created)
+    counts["bookings"] = bulk_insert(Booking, (
+        "id", "customer_id", "provider_id", "service_id", "booking_date",
+        "booking_time", "status", "total_price", "notes", "created_at", "updated_at"
+    ), booking_rows(), defer_indexes=True)
+
+    def message_rows():
+        message_id = _next_id(Message)
+        for _ in range(threads if providers and customers else 0):
+            c = rng.randrange(customers)
+            p = rng.randrange(providers)
+            sent = now - timedelta(days=rng.randint(0, days), minutes=rng.randint(0, 1440))
+            length = rng.randint(1, messages_per_thread * 2 - 1)
+            for n in range(length):
+                from_customer = n % 2 == 0
+                sent += timedelta(minutes=rng.randint(1, 240))
+                yield (message_id, customer_ids[c], provider_ids[p],
+                       customer_users[c] if from_customer else provider_users[p],
+                       "customer" if from_customer else "provider",
+                       MESSAGE_LINES[n % len(MESSAGE_LINES)], n < length - 2, sent)
+                message_id += 1
+    counts["messages"] = bulk_insert(Message, (
+        "id", "customer_id", "provider_id", "sender_id", "sender_type",
+        "message", "is_read", "created_at"
+    ), message_rows(), defer_indexes=True)
+
+    db.session.commit()
+
+    earnings.rebuild()
+    if search.available():
+        search.rebuild()
+    # New providers have no cached pages yet; the catalog has
+    cache.invalidate("catalog")
+    return counts
@@ -0,0 +1,117 @@
+"""
+Transactional SMS outbox.
+
+Routes never talk to the SMS gateway. They call enqueue_sms() inside their
+own transaction, so a message is only recorded if the booking commits, and
+`flask sms-worker` delivers queued rows in the background with retries and
+exponential backoff. While the gateway's circuit breaker is open, messages
+are put back until it half-opens without using up an attempt.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from api.models import db, SmsOutbox
+from api.sms_service import CircuitOpenError
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+# A claimed row is leased to one worker for this long; if that worker dies
+# the row becomes due again and another worker picks it up.
+LEASE_SECONDS = 300
+
+
+def enqueue_sms(phone, message, booking_id=None):
+    """Add a message to the current session. The caller commits."""
+    entry = SmsOutbox(
+        phone=phone,
+        message=message,
+        booking_id=booking_id,
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow()
+    )
+    db.session.add(entry)
+    return entry
+
+
+def backoff_seconds(attempts):
+    return min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+
+
+def claim_batch(batch_size):
+    """
+    Lease up to `batch_size` due messages and return them as plain dicts.
+    On Postgres, SKIP LOCKED lets several workers drain the table at once.
+    """
+    now = datetime.utcnow()
+    rows = SmsOutbox.query.filter(
+        SmsOutbox.status.in_(['pending', 'sending']),
+        SmsOutbox.next_attempt_at <= now
+    ).order_by(SmsOutbox.next_attempt_at).limit(batch_size).with_for_update(
+        skip_locked=True
+    ).all()
+
+    for row in rows:
+        row.status = 'sending'
+        row.attempts += 1
+        row.next_attempt_at = now + timedelta(seconds=LEASE_SECONDS)
+
+    claimed = [{'id': r.id, 'phone': r.phone, 'message': r.message,
+                'attempts': r.attempts} for r in rows]
+    db.session.commit()
+    return claimed
+
+
+def _deliver(sms_service, item):
+    try:
+        sms_service.send_sms(item['phone'], item['message'])
+        return item, None
+    except Exception as e:
+        return item, e
+
+
+def drain(sms_service, batch_size=50, workers=4):
+    """
+    Deliver one batch concurrently. Returns (sent, failed) counts; failed
+    messages are rescheduled until MAX_ATTEMPTS is reached. Messages turned
+    away by an open circuit are neither: they are due again when it
+    half-opens, with the attempt given back.
+    """
+    claimed = claim_batch(batch_size)
+    if not claimed:
+        return 0, 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda item: _deliver(sms_service, item), claimed))
+
+    ids = [item['id'] for item in claimed]
+    rows = {r.id: r for r in SmsOutbox.query.filter(SmsOutbox.id.in_(ids))}
+
+    now = datetime.utcnow()
+    sent = failed = 0
+    for item, error in results:
+        row = rows[item['id']]
+        if error is None:
+            row.status = 'sent'
+            row.sent_at = now
+            row.last_error = None
+            sent += 1
+        elif isinstance(error, CircuitOpenError):
+            row.last_error = str(error)
+            row.attempts -= 1
+            row.status = 'pending'
+            row.next_attempt_at = now + timedelta(
+                seconds=sms_service.breaker.retry_after())
+        else:
+            row.last_error = str(error)
+            if item['attempts'] >= MAX_ATTEMPTS:
+                row.status = 'failed'
+            else:
+                row.status = 'pending'
+                row.next_attempt_at = now + timedelta(
+                    seconds=backoff_seconds(item['attempts']))
+            failed += 1
+
+    db.session.commit()
+    return sent, failed
@@ -1,18 +1,203 @@
 import os
+import random
+import threading
+import time
+import itertools
 import requests
+from requests.adapters import HTTPAdapter
+from api import request_timing, metrics, tracing
+
+
+class CircuitOpenError(ValueError):
+    """Raised without calling the gateway while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast after `failure_threshold` consecutive gateway errors. After
+    `reset_timeout` seconds one trial call is let through (half-open); its
+    result closes the circuit again or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a trial call through."""
+        if self.opened_at is None:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self.opened_at), 0.0)
+
+    def _before_call(self):
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial_running):
+                raise CircuitOpenError("SMS gateway unavailable (circuit open)")
+            if state == "half-open":
+                self._trial_running = True
+
+    def _on_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def _on_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def call(self, fn, *args, **kwargs):
+        self._before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self._on_failure()
+            raise
+        self._on_success()
+        return result
+
+
+# ============================================
+# Gateway backends
+# ============================================
+# A backend performs the raw HTTP-level call and returns TextBelt-shaped
+# dicts. It raises GatewayError for transport failures (which count against
+# the circuit breaker); a {"success": false} reply is a normal result.
+
+class GatewayError(Exception):
+    pass
+
+
+class TextbeltBackend:
+    def __init__(self, api_key, base_url="https://textbelt.com"):
+        if not api_key:
+            raise ValueError("TEXTBELT_API_KEY is required")
+
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = (
+            float(os.environ.get("SMS_CONNECT_TIMEOUT", 3.05)),
+            float(os.environ.get("SMS_READ_TIMEOUT", 10)),
+        )
+
+        # One keep-alive pool per process instead of a TLS handshake per SMS
+        pool_size = int(os.environ.get("SMS_POOL_SIZE", 10))
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size))
+        self.session.mount("http://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size))
+
+    def _request(self, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.exceptions.RequestException as e:
+            raise GatewayError(str(e))
+        finally:
+            request_timing.record('http', time.perf_counter() - start)
+
+        if response.status_code >= 500:
+            raise GatewayError(f"HTTP {response.status_code}")
+
+        try:
+            return response.json()
+        except ValueError:
+            raise GatewayError(f"Invalid response (HTTP {response.status_code})")
+
+    def send(self, phone_number, message, sender):
+        return self._request("POST", "/text", data={
+            "phone": phone_number,
+            "message": message,
+            "key": self.api_key,
+            "sender": sender  # Optional, for regulatory purposes
+        })
+
+    def quota(self):
+        return self._request("GET", f"/quota/{self.api_key}")
+
+    def status(self, text_id):
+        return self._request("GET", f"/status/{text_id}")
+
+
+class FakeBackend:
+    """
+    Local stand-in for TextBelt used for development and offline load tests.
+    Latency and failure rate come from SMS_FAKE_LATENCY_MS and
+    SMS_FAKE_FAILURE_RATE; sent messages are kept in `outbox`.
+    """
+
+    def __init__(self, latency_ms=None, failure_rate=None, quota=1000):
+        self.latency = float(
+            latency_ms if latency_ms is not None
+            else os.environ.get("SMS_FAKE_LATENCY_MS", 0)) / 1000
+        self.failure_rate = float(
+            failure_rate if failure_rate is not None
+            else os.environ.get("SMS_FAKE_FAILURE_RATE", 0))
+        self.quota_remaining = quota
+        self.outbox = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _simulate(self):
+        if self.latency:
+            time.sleep(self.latency)
+            request_timing.record('http', self.latency)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise GatewayError("Simulated gateway failure")
+
+    def send(self, phone_number, message, sender):
+        self._simulate()
+        with self._lock:
+            text_id = next(self._ids)
+            self.quota_remaining -= 1
+            self.outbox.append((text_id, phone_number, message))
+            return {"success": True, "textId": text_id,
+                    "quotaRemaining": self.quota_remaining}
+
+    def quota(self):
+        self._simulate()
+        return {"success": True, "quotaRemaining": self.quota_remaining}
+
+    def status(self, text_id):
+        self._simulate()
+        return {"status": "DELIVERED"}
+
+
+def backend_from_env():
+    if os.environ.get("SMS_BACKEND", "textbelt") == "fake":
+        return FakeBackend()
+    return TextbeltBackend(os.environ.get("TEXTBELT_API_KEY"))
+
 
 class SMSService:
-    def __init__(self):
-        self.api_key = os.environ.get("TEXTBELT_API_KEY")
+    def __init__(self, backend=None, breaker=None):
         self.sender_name = os.environ.get("TEXTBELT_SENDER_NAME", "HomeCalls")
-        self.base_url = "https://textbelt.com"
-        
-        if not self.api_key:
-            raise ValueError("TEXTBELT_API_KEY is required")
-    
+        self.backend = backend or backend_from_env()
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.environ.get("SMS_BREAKER_THRESHOLD", 5)),
+            reset_timeout=float(os.environ.get("SMS_BREAKER_RESET", 30)))
+
     def send_sms(self, phone_number, message):
         """
-        Send SMS via TextBelt paid API
+        Send SMS through the configured backend (TextBelt paid API by default)
         
         Args:
             phone_number (str): Phone number (10-digit for US or E.164 format)
@@ -28,35 +213,38 @@ class SMSService:
                 "textId": 12345
             }
         """
+        with tracing.span('sms.send', tracing.CLIENT, {
+                'sms.backend': type(self.backend).__name__}):
+            return self._send_sms(phone_number, message)
+
+    def _record(self, result, start, quota=None):
+        metrics.record_sms(result, time.perf_counter() - start, quota)
+        tracing.set_attribute('sms.result', result)
+
+    def _send_sms(self, phone_number, message):
+        start = time.perf_counter()
         try:
-          
-            url = f"{self.base_url}/text"
-            
-            
-            payload = {
-                "phone": phone_number,
-                "message": message,
-                "key": self.api_key,
-                "sender": self.sender_name  # Optional, for regulatory purposes
-            }
-            
-         
-            response = requests.post(url, data=payload)
-            result = response.json()
-            
-            if result.get("success"):
-                print(f"✓ SMS sent successfully to {phone_number}")
-                print(f"  - Text ID: {result.get('textId')}")
-                print(f"  - Quota remaining: {result.get('quotaRemaining')}")
-                return result
-            else:
-                error_msg = result.get("error", "Unknown error")
-                print(f"✗ SMS failed: {error_msg}")
-                raise ValueError(f"TextBelt error: {error_msg}")
-                
-        except requests.exceptions.RequestException as e:
+            result = self.breaker.call(
+                self.backend.send, phone_number, message, self.sender_name)
+        except CircuitOpenError:
+            self._record("circuit_open", start)
+            raise
+        except GatewayError as e:
+            self._record("error", start)
             print(f"✗ Network error: {str(e)}")
             raise ValueError(f"Failed to send SMS: {str(e)}")
+
+        if result.get("success"):
+            self._record("sent", start, result.get("quotaRemaining"))
+            print(f"✓ SMS sent successfully to {phone_number}")
+            print(f"  - Text ID: {result.get('textId')}")
+            print(f"  - Quota remaining: {result.get('quotaRemaining')}")
+            return result
+        else:
+            self._record("rejected", start)
+            error_msg = result.get("error", "Unknown error")
+            print(f"✗ SMS failed: {error_msg}")
+            raise ValueError(f"TextBelt error: {error_msg}")
     
     def check_quota(self):
         """
@@ -66,9 +254,7 @@ class SMSService:
             dict: {"success": true, "quotaRemaining": 98}
         """
         try:
-            url = f"{self.base_url}/quota/{self.api_key}"
-            response = requests.get(url)
-            result = response.json()
+            result = self.breaker.call(self.backend.quota)
             
             if result.get("success"):
                 quota = result.get("quotaRemaining", 0)
@@ -92,9 +278,7 @@ class SMSService:
             dict: {"status": "DELIVERED|SENT|SENDING|FAILED|UNKNOWN"}
         """
         try:
-            url = f"{self.base_url}/status/{text_id}"
-            response = requests.get(url)
-            result = response.json()
+            result = self.breaker.call(self.backend.status, text_id)
             
             status = result.get("status", "UNKNOWN")
             print(f"SMS {text_id} status: {status}")
@@ -104,33 +288,64 @@ class SMSService:
             print(f"Error checking status: {str(e)}")
             raise
     
-    def send_booking_confirmation_to_customer(self, customer_phone, provider_name, provider_phone, provider_email):
-        """
-        Send booking confirmation SMS to customer
-        """
-        message = f"""HomeCalls Booking Confirmed!
+    @staticmethod
+    def booking_confirmation_message(provider_name, provider_phone, provider_email):
+        return f"""HomeCalls Booking Confirmed!
 
 Service provider: {provider_name}
 Contact: {provider_phone}
 Email: {provider_email}
 
 Thank you for booking with HomeCalls!"""
-        
-        return self.send_sms(customer_phone, message)
-    
-    def send_booking_notification_to_provider(self, provider_phone, customer_name, customer_address, service_name):
-        """
-        Send new booking notification SMS to provider
-        """
-        message = f"""New Booking on HomeCalls!
+
+    @staticmethod
+    def booking_notification_message(customer_name, customer_address, service_name):
+        return f"""New Booking on HomeCalls!
 
 Customer: {customer_name}
 Address: {customer_address}
 Service: {service_name}
 
 Please contact the customer to confirm."""
-        
+
+    def send_booking_confirmation_to_customer(self, customer_phone, provider_name, provider_phone, provider_email):
+        """
+        Send booking confirmation SMS to customer
+        """
+        message = self.booking_confirmation_message(
+            provider_name, provider_phone, provider_email)
+
+        return self.send_sms(customer_phone, message)
+
+    def send_booking_notification_to_provider(self, provider_phone, customer_name, customer_address, service_name):
+        """
+        Send new booking notification SMS to provider
+        """
+        message = self.booking_notification_message(
+            customer_name, customer_address, service_name)
+
         return self.send_sms(provider_phone, message)
 
-# Create singleton instance
-sms_service = SMSService()
\ No newline at end of file
+
+_sms_service = None
+_sms_service_lock = threading.Lock()
+
+
+def get_sms_service():
+    """
+    The shared SMSService, created on first use so that importing this
+    module (and starting the app) does not need TEXTBELT_API_KEY.
+    """
+    global _sms_service
+    if _sms_service is None:
+        with _sms_service_lock:
+            if _sms_service is None:
+                _sms_service = SMSService()
+    return _sms_service
+
+
+def __getattr__(name):
+    # Keeps `from api.sms_service import sms_service` working
+    if name == 'sms_service':
+        return get_sms_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,491 @@
+"""
+Request tracing: a root span per `api` blueprint request, with child spans
+for each SQL statement, each serialization step (building the response
+dicts, see api.projections.serializing, and each JSON encoding, whether
+jsonify or a streamed batch) and each SMSService.send_sms call, exported
+as OTLP/JSON.
+
+Config (app.config, falling back to the environment):
+    TRACE_EXPORTER       none (default), file, otlp or console
+    TRACE_FILE           file exporter output, default traces.jsonl. One
+                         OTLP ExportTraceServiceRequest per line, the format
+                         the OpenTelemetry Collector's otlpjsonfile receiver
+                         and `flask trace-collector` write
+    TRACE_OTLP_ENDPOINT  otlp exporter URL, default
+                         http://localhost:4318/v1/traces (`flask trace-collector`
+                         listens there for offline use)
+    TRACE_SAMPLE_RATE    fraction of traces kept, default 0.1
+    TRACE_SERVICE_NAME   resource service.name, default "backend"
+
+A W3C `traceparent` request header continues the caller's trace and its
+sampled flag overrides TRACE_SAMPLE_RATE. An unsampled request costs one
+random() call and a context variable lookup per statement; with no exporter
+no hooks are installed at all. Spans are exported in batches by a
+background thread, never on the request path.
+
+Other exporters: register_exporter(name, factory), where factory(app)
+returns an object with export(spans).
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+INTERNAL, SERVER, CLIENT = 1, 2, 3
+
+MAX_SPANS_PER_TRACE = 1000
+MAX_STATEMENT_LENGTH = 1000
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 2.0
+EXPORT_QUEUE_SIZE = 2048
+
+# The innermost open span, or NOT_SAMPLED inside a request that was not kept
+_current = ContextVar('trace_span', default=None)
+NOT_SAMPLED = object()
+
+_processor = None
+_sample_rate = 0.0
+
+
+class _Trace:
+    __slots__ = ('trace_id', 'spans', 'dropped')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.spans = []
+        self.dropped = 0
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'root',
+                 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, trace, parent_id, name, kind=INTERNAL, attributes=None, root=False):
+        self.trace = trace
+        self.root = root
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def child(self, name, kind=INTERNAL, attributes=None):
+        return Span(self.trace, self.span_id, name, kind, attributes)
+
+    def finish(self, error=None):
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = error
+        trace = self.trace
+        if not self.root:
+            if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+                trace.dropped += 1
+            else:
+                trace.spans.append(self)
+            return
+
+        # The root ends last; hand the whole trace to the exporter
+        if trace.dropped:
+            self.attributes['trace.dropped_spans'] = trace.dropped
+        trace.spans.append(self)
+        if _processor is not None:
+            _processor.submit(trace.spans)
+
+
+def _sampled():
+    return _sample_rate >= 1 or (_sample_rate > 0 and random.random() < _sample_rate)
+
+
+def _root(name, kind, attributes, traceparent=None):
+    """A new trace, or the caller's one when `traceparent` is valid."""
+    parent_id = None
+    trace_id = None
+    if traceparent:
+        parts = traceparent.strip().split('-')
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            try:
+                sampled = int(parts[3], 16) & 1
+            except ValueError:
+                sampled = None
+            if sampled is not None:
+                if not sampled:
+                    return NOT_SAMPLED
+                trace_id, parent_id = parts[1], parts[2]
+
+    if trace_id is None:
+        if not _sampled():
+            return NOT_SAMPLED
+        trace_id = os.urandom(16).hex()
+
+    return Span(_Trace(trace_id), parent_id, name, kind, attributes, root=True)
+
+
+def current_span():
+    span = _current.get()
+    return span if isinstance(span, Span) else None
+
+
+def set_attribute(key, value):
+    """Set an attribute on the innermost open span, if the trace is sampled."""
+    span = _current.get()
+    if isinstance(span, Span):
+        span.attributes[key] = value
+
+
+@contextmanager
+def span(name, kind=INTERNAL, attributes=None):
+    """
+    Child span of the current one. Outside a traced request (e.g. the
+    sms-worker) it starts a new trace, subject to sampling.
+    """
+    parent = _current.get()
+    if parent is NOT_SAMPLED or (parent is None and _processor is None):
+        yield None
+        return
+
+    new = parent.child(name, kind, attributes) if parent is not None else _root(name, kind, attributes)
+    if new is NOT_SAMPLED:
+        yield None
+        return
+
+    token = _current.set(new)
+    try:
+        yield new
+    except BaseException as e:
+        new.finish(error=f"{type(e).__name__}: {e}")
+        raise
+    else:
+        new.finish()
+    finally:
+        _current.reset(token)
+
+
+# ============================================
+# SQL
+# ============================================
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if isinstance(parent, Span):
+        conn.info['trace_span'] = parent.child(
+            statement.split(None, 1)[0].upper() if statement else 'SQL', CLIENT, {
+                'db.system': conn.dialect.name,
+                'db.statement': statement[:MAX_STATEMENT_LENGTH],
+            })
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = conn.info.pop('trace_span', None)
+    if span is not None:
+        rowcount = getattr(cursor, 'rowcount', -1)
+        if rowcount is not None and rowcount >= 0:
+            span.attributes['db.rows'] = rowcount
+        span.finish()
+
+
+def _handle_error(context):
+    conn = context.connection
+    span = conn.info.pop('trace_span', None) if conn is not None else None
+    if span is not None:
+        error = context.original_exception
+        span.finish(error=f"{type(error).__name__}: {error}")
+
+
+# ============================================
+# Export
+# ============================================
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def otlp_payload(spans, service_name):
+    """An OTLP/JSON ExportTraceServiceRequest for `spans`."""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{
+            'scope': {'name': 'api.tracing'},
+            'spans': [{
+                'traceId': s.trace.trace_id,
+                'spanId': s.span_id,
+                'parentSpanId': s.parent_id or '',
+                'name': s.name,
+                'kind': s.kind,
+                'startTimeUnixNano': str(s.start),
+                'endTimeUnixNano': str(s.end),
+                'attributes': [{'key': k, 'value': _attribute_value(v)}
+                               for k, v in s.attributes.items()],
+                'status': {'code': 2, 'message': s.error} if s.error else {'code': 0},
+            } for s in spans],
+        }],
+    }]}
+
+
+class FileExporter:
+    """Appends one OTLP/JSON request per batch to `path`."""
+
+    def __init__(self, path, service_name):
+        self.path = path
+        self.service_name = service_name
+
+    def export(self, spans):
+        line = json.dumps(otlp_payload(spans, self.service_name), separators=(',', ':'))
+        with open(self.path, 'a') as f:
+            f.write(line + "\n")
+
+
+class OTLPExporter:
+    """POSTs OTLP/JSON to a collector's /v1/traces endpoint."""
+
+    def __init__(self, endpoint, service_name, timeout=5):
+        import requests
+        self.session = requests.Session()
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def export(self, spans):
+        response = self.session.post(
+            self.endpoint, json=otlp_payload(spans, self.service_name), timeout=self.timeout)
+        response.raise_for_status()
+
+
+class ConsoleExporter:
+    """Prints each trace as an indented tree; for local debugging."""
+
+    def export(self, spans):
+        children = {}
+        for s in spans:
+            children.setdefault(s.parent_id, []).append(s)
+
+        def show(s, depth):
+            attrs = ' '.join(f"{k}={v}" for k, v in s.attributes.items() if k != 'db.statement')
+            error = f" ERROR {s.error}" if s.error else ''
+            print(f"{'  ' * depth}{s.name} {(s.end - s.start) / 1e6:.1f} ms {attrs}{error}")
+            for child in sorted(children.get(s.span_id, []), key=lambda c: c.start):
+                show(child, depth + 1)
+
+        for root in spans:
+            if root.root:
+                print(f"trace {root.trace.trace_id}")
+                show(root, 1)
+
+
+EXPORTERS = {
+    'file': lambda app: FileExporter(
+        _config(app, 'TRACE_FILE', 'traces.jsonl'), _service_name(app)),
+    'otlp': lambda app: OTLPExporter(
+        _config(app, 'TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces'), _service_name(app)),
+    'console': lambda app: ConsoleExporter(),
+}
+
+
+def register_exporter(name, factory):
+    EXPORTERS[name] = factory
+
+
+class BatchProcessor:
+    """
+    Queues finished traces; a background thread exports them every
+    EXPORT_INTERVAL seconds, EXPORT_BATCH_SIZE spans per call. Traces are
+    dropped, not blocked on, when the queue is full. The thread is started
+    lazily so forked workers (gunicorn --preload) get their own.
+    """
+
+    def __init__(self, exporter, logger):
+        self.exporter = exporter
+        self.logger = logger
+        self.pid = None
+        self.dropped = 0
+        atexit.register(self.flush)
+
+    def _start(self):
+        self.pid = os.getpid()
+        self.queue = queue.Queue(EXPORT_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        threading.Thread(target=self._run, name='trace-exporter', daemon=True).start()
+
+    def submit(self, spans):
+        if self.pid != os.getpid():
+            self._start()
+        try:
+            self.queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            time.sleep(EXPORT_INTERVAL)
+            self.flush()
+
+    def flush(self):
+        """Export everything queued so far (also called at exit)."""
+        if self.pid != os.getpid():
+            return
+        with self.lock:
+            batch = []
+            while True:
+                try:
+                    batch.extend(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            for i in range(0, len(batch), EXPORT_BATCH_SIZE):
+                chunk = batch[i:i + EXPORT_BATCH_SIZE]
+                try:
+                    self.exporter.export(chunk)
+                except Exception as e:
+                    self.logger.warning("Trace export failed (%d spans): %s", len(chunk), e)
+
+
+def serve_collector(host, port, path):
+    """
+    Minimal OTLP/HTTP JSON receiver: appends each request to `path` as one
+    line and prints a summary of every root span it contains.
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != '/v1/traces':
+                self.send_error(404)
+                return
+            if not self.headers.get('Content-Type', '').startswith('application/json'):
+                self.send_error(415, 'Only OTLP/JSON is supported')
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_error(400, 'Invalid JSON')
+                return
+
+            with lock:
+                with open(path, 'a') as f:
+                    f.write(json.dumps(payload, separators=(',', ':')) + "\n")
+            for resource in payload.get('resourceSpans', []):
+                for scope in resource.get('scopeSpans', []):
+                    for s in scope.get('spans', []):
+                        if s.get('kind') == SERVER or not s.get('parentSpanId'):
+                            ms = (int(s['endTimeUnixNano']) - int(s['startTimeUnixNano'])) / 1e6
+                            print(f"{s['traceId']}  {ms:8.1f} ms  {s['name']}")
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(b'{}')
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"Collecting OTLP/JSON traces on http://{host}:{port}/v1/traces into {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+# ============================================
+# Flask wiring
+# ============================================
+
+def _config(app, name, default):
+    return app.config.get(name, os.environ.get(name, default))
+
+
+def _service_name(app):
+    return _config(app, 'TRACE_SERVICE_NAME', 'backend')
+
+
+def setup_tracing(app):
+    global _processor, _sample_rate
+
+    exporter = str(_config(app, 'TRACE_EXPORTER', 'none')).lower()
+    if exporter in ('', 'none', '0', 'false'):
+        return
+    if exporter not in EXPORTERS:
+        raise ValueError(f"Unknown TRACE_EXPORTER '{exporter}' (expected one of {', '.join(EXPORTERS)})")
+
+    _processor = BatchProcessor(EXPORTERS[exporter](app), app.logger)
+    _sample_rate = float(_config(app, 'TRACE_SAMPLE_RATE', 0.1))
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+    dumps = app.json.dumps
+
+    def traced_dumps(obj, **kwargs):
+        parent = _current.get()
+        if not isinstance(parent, Span):
+            return dumps(obj, **kwargs)
+        span = parent.child('serialize', attributes={
+            'rows': len(obj) if isinstance(obj, list) else 1})
+        try:
+            return dumps(obj, **kwargs)
+        finally:
+            span.finish()
+    app.json.dumps = traced_dumps
+
+    @app.before_request
+    def start_trace():
+        if request.blueprint != 'api':
+            return
+        rule = request.url_rule.rule if request.url_rule else request.path
+        root = _root(f"{request.method} {rule}", SERVER, {
+            'http.method': request.method,
+            'http.route': rule,
+        }, request.headers.get('traceparent'))
+        g.trace_token = _current.set(root)
+
+    @app.after_request
+    def tag_trace(response):
+        root = current_span()
+        if root is not None and 'trace_token' in g:
+            root.attributes['http.status_code'] = response.status_code
+            if g.get('current_role'):
+                root.attributes[f"{g.current_role}_id"] = g.current_profile_id
+            for key, value in (request.view_args or {}).items():
+                root.attributes.setdefault(key, value)
+        return response
+
+    # Teardown rather than after_request: streamed responses are still
+    # encoding rows after after_request has run.
+    @app.teardown_request
+    def finish_trace(exc):
+        token = g.pop('trace_token', None)
+        if token is None:
+            return
+        root = _current.get()
+        if isinstance(root, Span):
+            if isinstance(exc, GeneratorExit):
+                # The client went away before a streamed body was finished
+                root.attributes['http.client_disconnected'] = True
+                exc = None
+            root.finish(error=f"{type(exc).__name__}: {exc}" if exc else None)
+        try:
+            _current.reset(token)
+        except ValueError:
+            _current.set(None)
@@ -1,7 +1,18 @@
-from flask import jsonify
+import os
+import threading
+import weakref
+import time as _time
+import base64
+import json
+from collections import OrderedDict
+from datetime import date, time, datetime
+from decimal import Decimal
+from flask import jsonify, request, g, current_app, Response, stream_with_context
 from functools import wraps
-from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
-from api.models import User
+from sqlalchemy import tuple_
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from api.models import db, User, Provider, Customer
+from api.projections import serializing
 
 class APIException(Exception):
     status_code = 400
@@ -18,6 +29,202 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+
+# Engines to give fresh pools in forked children, and engines that borrow
+# another engine's pool (re-pointed after that one is refreshed). Weak, so
+# an app that is thrown away does not stay alive for the fork hook.
+_fork_engines = weakref.WeakSet()
+_borrowed_pools = weakref.WeakKeyDictionary()
+
+
+def _refresh_pools_after_fork():
+    for engine in list(_fork_engines):
+        engine.dispose(close=False)
+    for engine, owner in list(_borrowed_pools.items()):
+        engine.pool = owner.pool
+
+
+def dispose_engines_after_fork(app):
+    """
+    Give processes forked from this one (gunicorn --preload workers) fresh
+    connection pools for `app`'s engines instead of the parent's sockets.
+    """
+    with app.app_context():
+        _fork_engines.update(db.engines.values())
+
+
+def borrow_pool(engine, owner):
+    """Make `engine` use `owner`'s pool, also in forked children."""
+    engine.pool = owner.pool
+    _borrowed_pools[engine] = owner
+
+
+os.register_at_fork(after_in_child=_refresh_pools_after_fork)
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+STREAM_BATCH_SIZE = 1000
+
+
+def encode_cursor(values):
+    """Pack the sort-key values of the last row into an opaque token."""
+    plain = [v.isoformat() if isinstance(v, (date, time, datetime)) else v
+             for v in values]
+    raw = json.dumps(plain, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, columns):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        plain = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(plain, list) or len(plain) != len(columns):
+            raise ValueError(cursor)
+
+        return [_cursor_value(value, column) for value, column in zip(plain, columns)]
+    except (ValueError, TypeError, ArithmeticError):
+        raise APIException('Invalid cursor', status_code=400)
+
+
+def _cursor_value(value, column):
+    """
+    Check one decoded cursor value against its column's type, so a
+    hand-edited cursor is a 400 here rather than a DataError in the database.
+    """
+    if isinstance(value, (list, dict)) or value is None:
+        raise TypeError(value)
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        # Computed columns (e.g. a search score): any JSON scalar
+        return value
+
+    if python_type in (date, time, datetime):
+        return python_type.fromisoformat(value)
+    if python_type is bool:
+        if not isinstance(value, bool):
+            raise TypeError(value)
+        return value
+    if isinstance(value, bool):
+        raise TypeError(value)
+    if python_type is int:
+        if not isinstance(value, int):
+            raise TypeError(value)
+        return value
+    if python_type in (float, Decimal):
+        if not isinstance(value, (int, float)):
+            raise TypeError(value)
+        return python_type(str(value)) if python_type is Decimal else float(value)
+    if python_type is str and not isinstance(value, str):
+        raise TypeError(value)
+    return value
+
+
+def page_limit():
+    """
+    The request's `limit` arg as a positive int (None when absent); 400 for
+    anything else. Callers cap it at MAX_PAGE_SIZE.
+    """
+    limit = request.args.get('limit')
+    if limit is None:
+        return None
+    try:
+        limit = int(limit)
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise APIException('limit must be a positive integer', status_code=400)
+    return limit
+
+
+def keyset_page(query, order_by, descending=False):
+    """
+    Order `query` by the `order_by` columns (the last one must be unique,
+    normally the primary key) and apply keyset pagination from the
+    request's `limit` and `cursor` args.
+
+    Returns (rows, next_cursor). Without `limit` or `cursor` every row is
+    returned and next_cursor is None.
+    """
+    limit = page_limit()
+    cursor = request.args.get('cursor')
+
+    direction = [c.desc() if descending else c.asc() for c in order_by]
+    query = query.order_by(*direction)
+
+    if cursor:
+        after = decode_cursor(cursor, order_by)
+        keys = tuple_(*order_by)
+        query = query.filter(keys < tuple_(*after) if descending else keys > tuple_(*after))
+        if limit is None:
+            limit = DEFAULT_PAGE_SIZE
+
+    if limit is None:
+        return query.all(), None
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor([getattr(last, c.key) for c in order_by])
+
+
+def page_response(items, next_cursor):
+    """
+    Plain list for unpaginated requests (existing clients), otherwise
+    {"items": [...], "nextCursor": ...}.
+    """
+    if 'limit' not in request.args and 'cursor' not in request.args:
+        return items
+    return {'items': items, 'nextCursor': next_cursor}
+
+
+def wants_stream():
+    return request.args.get('stream', '').lower() in ('1', 'true')
+
+
+def stream_json(query, to_dict, batch_size=STREAM_BATCH_SIZE):
+    """
+    Respond with every row of `query` as one JSON array, written while the
+    rows are read. Rows come from a server-side cursor (yield_per) and are
+    encoded `batch_size` at a time, so memory stays flat however many rows
+    match and the first bytes go out before the query is exhausted.
+
+    The status line is sent up front: an error mid-stream is logged and
+    leaves the array unterminated, which clients see as invalid JSON.
+    """
+    dumps = current_app.json.dumps
+
+    def encode(rows):
+        with serializing(len(rows)):
+            items = [to_dict(row) for row in rows]
+        return dumps(items)[1:-1]
+
+    def generate():
+        yield '['
+        separator = ''
+        batch = []
+        try:
+            for row in query.yield_per(batch_size):
+                batch.append(row)
+                if len(batch) == batch_size:
+                    yield separator + encode(batch)
+                    separator = ','
+                    batch = []
+            if batch:
+                yield separator + encode(batch)
+        except Exception:
+            current_app.logger.exception("Streaming response failed")
+            return
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json',
+                    headers={'X-Accel-Buffering': 'no'})
+
+
 def has_no_empty_params(rule):
     defaults = rule.defaults or ()
     arguments = rule.arguments or ()
@@ -56,34 +263,102 @@ def role_required(required_role):
         return decorated
     return decorator_wrapper
 
-def provider_required():
+
+# Tokens carry the user's role and profile id as signed claims, so the
+# decorators below only need to know whether the account is still active.
+# That answer is cached per process for AUTH_CACHE_TTL seconds, which bounds
+# how long a deactivated or deleted user keeps access.
+AUTH_CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 30))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 10000))
+_auth_cache = OrderedDict()
+_auth_cache_lock = threading.Lock()
+
+
+def user_status(user_id):
+    """
+    Return (is_active, role) for a user, cached for AUTH_CACHE_TTL. The
+    cache keeps the AUTH_CACHE_MAX_ENTRIES most recently seen users.
+    """
+    now = _time.monotonic()
+    with _auth_cache_lock:
+        cached = _auth_cache.get(user_id)
+        if cached and cached[0] > now:
+            _auth_cache.move_to_end(user_id)
+            return cached[1]
+
+    row = db.session.query(User.is_active, User.role).filter(
+        User.id == user_id).first()
+    status = (bool(row.is_active), row.role) if row else (False, None)
+    with _auth_cache_lock:
+        _auth_cache[user_id] = (now + AUTH_CACHE_TTL, status)
+        _auth_cache.move_to_end(user_id)
+        while len(_auth_cache) > AUTH_CACHE_MAX_ENTRIES:
+            _auth_cache.popitem(last=False)
+    return status
+
+
+def profile_claims(user):
+    """Additional JWT claims for `create_access_token`."""
+    profile = user.provider_profile if user.role == 'provider' else user.customer_profile
+    return {'role': user.role, 'profile_id': profile.id if profile else None}
+
+
+PROFILE_MODELS = {'provider': Provider, 'customer': Customer}
+
+
+def _profile_required(*roles):
     def wrapper(fn):
         @wraps(fn)
         def decorator(*args, **kwargs):
             verify_jwt_in_request()
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)
-            user = User.query.get(user_id)
-            
-            if not user or user.role != 'provider':
-                return jsonify({'message': 'Provider access required'}), 403
-            
+            user_id = int(get_jwt_identity())
+
+            is_active, user_role = user_status(user_id)
+            if not is_active or user_role not in roles:
+                label = ' or '.join(r.capitalize() for r in roles)
+                return jsonify({'message': f'{label} access required'}), 403
+
+            profile_id = get_jwt().get('profile_id')
+            if profile_id is None:
+                # Tokens issued before profile claims existed
+                profile_id = db.session.query(PROFILE_MODELS[user_role].id).filter_by(
+                    user_id=user_id).scalar()
+                if profile_id is None:
+                    return jsonify({'message': f'{user_role.capitalize()} profile not found'}), 404
+
+            g.current_user_id = user_id
+            g.current_role = user_role
+            g.current_profile_id = profile_id
+
             return fn(*args, **kwargs)
         return decorator
     return wrapper
 
+
+def provider_required():
+    return _profile_required('provider')
+
+
 def customer_required():
-    def wrapper(fn):
-        @wraps(fn)
-        def decorator(*args, **kwargs):
-            verify_jwt_in_request()
-            user_id_str = get_jwt_identity()
-            user_id = int(user_id_str)
-            user = User.query.get(user_id)
-            
-            if not user or user.role != 'customer':
-                return jsonify({'message': 'Customer access required'}), 403
-            
-            return fn(*args, **kwargs)
-        return decorator
-    return wrapper
+    return _profile_required('customer')
+
+
+def profile_required():
+    """Either role; routes branch on g.current_role."""
+    return _profile_required('customer', 'provider')
+
+
+def current_profile(*options):
+    """
+    The Provider or Customer of the authenticated user, loaded at most once
+    per request into g.current_profile. Routes that only need the id should
+    read g.current_profile_id instead.
+    """
+    if 'current_profile' not in g:
+        model = PROFILE_MODELS[g.current_role]
+        profile = db.session.get(model, g.current_profile_id, options=options)
+        if profile is None:
+            # The token names a profile that has since been deleted
+            raise APIException(f'{g.current_role.capitalize()} profile not found', 404)
+        g.current_profile = profile
+    return g.current_profile
@@ -1,23 +1,31 @@
 """
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
+
+create_app(config) builds the application; `app` at the bottom is the
+instance used by wsgi.py, `flask` commands and `python src/app.py`. To keep
+cold starts short, the parts most requests never touch are set up on first use:
+    - Flask-Admin is built on the first request under /admin
+    - Flask-Migrate (and Alembic) only under the `flask` CLI, for `flask db`
+    - the SMS client on the first message sent (api.sms_service.get_sms_service)
+
+Import time per subsystem is kept in app.extensions['startup_timings'] and
+printed at start-up with STARTUP_TIMING=1.
+
+With `gunicorn --preload` the parent process builds the app and workers fork
+from it; set WARM_START=1 to also build Flask-Admin in the parent. Database
+connections opened before the fork are never reused by a worker.
 """
 import os
+import time
+from contextlib import contextmanager
+import click
 from flask import Flask, request, jsonify, url_for
-from flask_migrate import Migrate
-from flask_swagger import swagger
-from api.utils import APIException, generate_sitemap
-from api.models import db
-from api.routes import api
-from api.admin import setup_admin
-from api.commands import setup_commands
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 
 # from models import Person
 
 ENV = "development" if os.getenv("FLASK_DEBUG") == "1" else "production"
-app = Flask(__name__)
-app.url_map.strict_slashes = False
 
 # ============================================
 # Configure CORS for frontend requests
@@ -33,68 +41,129 @@ allowed_origins = [
 if os.getenv("FRONTEND_URL"):
     allowed_origins.append(os.getenv("FRONTEND_URL"))
 
-if ENV == "production":
-    # In production, only allow specified origins
-    CORS(app, origins=allowed_origins, supports_credentials=True)
-else:
-    # In development, allow all origins
-    CORS(app)
-
-jwt_secret = os.environ.get('JWT_SECRET_KEY') or os.environ.get('FLASK_SECRET')
-if not jwt_secret:
-    raise ValueError(
-        "JWT_SECRET_KEY environment variable is not set. "
-        "This is required for authentication. Set it in Railway Variables."
-    )
-
-app.config["JWT_SECRET_KEY"] = jwt_secret
-jwt = JWTManager(app)
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-MIGRATE = Migrate(app, db, compare_type=True)
-db.init_app(app)
-
-setup_admin(app)
-setup_commands(app)
-
-app.register_blueprint(api, url_prefix='/api')
-
-@app.errorhandler(APIException)
-def handle_invalid_usage(error):
-    return jsonify(error.to_dict()), error.status_code
-
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Simple health check endpoint"""
-    return jsonify({
-        "status": "healthy",
-        "message": "Backend is running",
-        "environment": ENV
-    }), 200
-
-@app.route('/', methods=['GET'])
-def root():
-    """Root endpoint - returns API info"""
-    if ENV == "development":
-        return generate_sitemap(app)
+
+@contextmanager
+def timed(timings, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def _flag(app, name):
+    return str(app.config.get(name, os.environ.get(name, '0'))) in ('1', 'true', 'True')
+
+
+def create_app(config=None):
+    timings = {}
+    start = time.perf_counter()
+
+    with timed(timings, 'models'):
+        from api.models import db
+        from api.utils import APIException, generate_sitemap, dispose_engines_after_fork
+        from api.json_provider import FastJSONProvider
+    with timed(timings, 'routes'):
+        from api.routes import api
+    with timed(timings, 'commands'):
+        from api.commands import setup_commands
+    with timed(timings, 'observability'):
+        from api.request_timing import setup_request_timing
+        from api.metrics import setup_metrics
+        from api.tracing import setup_tracing
+        from api.profiler import setup_profiler
+    with timed(timings, 'admin'):
+        from api.admin import LazyAdmin
+
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+    app.json = FastJSONProvider(app)
+
+    if ENV == "production":
+        # In production, only allow specified origins
+        CORS(app, origins=allowed_origins, supports_credentials=True)
+    else:
+        # In development, allow all origins
+        CORS(app)
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
+            "postgres://", "postgresql://")
     else:
-        # In production, return API info instead of sitemap
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config["JWT_SECRET_KEY"] = os.environ.get('JWT_SECRET_KEY') or os.environ.get('FLASK_SECRET')
+    app.config.from_mapping(config or {})
+
+    if not app.config["JWT_SECRET_KEY"]:
+        raise ValueError(
+            "JWT_SECRET_KEY environment variable is not set. "
+            "This is required for authentication. Set it in Railway Variables."
+        )
+    JWTManager(app)
+
+    db.init_app(app)
+    dispose_engines_after_fork(app)
+
+    # `flask db` needs Flask-Migrate; serving requests never does
+    if app.config.get('MIGRATE', click.get_current_context(silent=True) is not None):
+        with timed(timings, 'migrate'):
+            from flask_migrate import Migrate
+            Migrate(app, db, compare_type=True)
+
+    setup_commands(app)
+    setup_request_timing(app)
+    setup_metrics(app)
+    setup_tracing(app)
+    setup_profiler(app)
+
+    app.register_blueprint(api, url_prefix='/api')
+
+    app.wsgi_app = LazyAdmin(app, app.wsgi_app, timings)
+    if _flag(app, 'WARM_START'):
+        app.wsgi_app.build()
+
+    @app.errorhandler(APIException)
+    def handle_invalid_usage(error):
+        return jsonify(error.to_dict()), error.status_code
+
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        """Simple health check endpoint"""
         return jsonify({
-            "message": "HomeCalls Backend API",
-            "version": "1.0.0",
-            "docs": "https://backend-production-eafd.up.railway.app/api/swagger",
-            "status": "running"
+            "status": "healthy",
+            "message": "Backend is running",
+            "environment": ENV
         }), 200
 
+    @app.route('/', methods=['GET'])
+    def root():
+        """Root endpoint - returns API info"""
+        if ENV == "development":
+            return generate_sitemap(app)
+        else:
+            # In production, return API info instead of sitemap
+            return jsonify({
+                "message": "HomeCalls Backend API",
+                "version": "1.0.0",
+                "docs": "https://backend-production-eafd.up.railway.app/api/swagger",
+                "status": "running"
+            }), 200
+
+    timings['create_app'] = time.perf_counter() - start
+    app.extensions['startup_timings'] = timings
+    if _flag(app, 'STARTUP_TIMING'):
+        print("Startup: " + ", ".join(
+            f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items()))
+    return app
+
+
+app = create_app()
+
 if __name__ == '__main__':
     # Railway uses PORT 8080 by default
     # Local development uses 3001
     PORT = int(os.environ.get('PORT', 3001))
-    app.run(host='0.0.0.0', port=PORT, debug=ENV == "development")
\ No newline at end of file
+    app.run(host='0.0.0.0', port=PORT, debug=ENV == "development")